@@ -0,0 +1,74 @@
+#logins per second under concurrent load, hashing inline on the request
+#thread vs in the process pool. run from the neighborly folder:
+#   python benchmarks/bench_login.py --threads 16 --seconds 5
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from website import create_app, db
+from website.models import User
+from website.passwords import get_hasher
+
+PASSWORD = 'benchmark-password'
+
+def run(workers, args, tmp):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(tmp, f"login-{workers}.db")}',
+        'PASSWORD_HASH_METHOD': args.method,
+        'PASSWORD_HASH_WORKERS': workers,
+        'PASSWORD_HASH_MAX_PENDING': args.threads,
+        'PASSWORD_HASH_QUEUE_TIMEOUT': 60,
+    })
+    with app.app_context():
+        password_hash = get_hasher().hash(PASSWORD)
+        db.session.add_all(User(email=f'user{i}@example.com', username=f'user{i}', first_name='Bench',
+                                password=password_hash) for i in range(args.threads))
+        db.session.commit()
+
+    done = []
+    deadline = time.perf_counter() + args.seconds
+
+    def client(i):
+        http = app.test_client()
+        count = 0
+        while time.perf_counter() < deadline:
+            response = http.post('/login', data={'email': f'user{i}@example.com', 'password': PASSWORD})
+            assert response.status_code == 302, response.status_code
+            count += 1
+        done.append(count)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        get_hasher().shutdown()
+    return sum(done) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--method', default='pbkdf2:sha256:100000')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        inline = run(0, args, tmp)
+        pooled = run(args.workers, args, tmp)
+
+    print(f'{args.threads} concurrent clients, {args.method}')
+    print(f'inline hashing   {inline:8.1f} logins/s')
+    print(f'process pool     {pooled:8.1f} logins/s  ({args.workers} workers)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+#load test for the main board routes: seeds a throwaway database, hits each
+#route from concurrent clients and reports latency percentiles, sql queries
+#per request and throughput. run from the neighborly folder:
+#   python benchmarks/bench_routes.py --posts 20000 --requests 500 --concurrency 8 --output results.json
+#   python benchmarks/bench_routes.py --compare results.json     (against an earlier run)
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from website import create_app, db
+from website.models import Post, User, ZipCentroid
+from website.passwords import get_hasher
+from seed_data import CATEGORIES, CITIES, PASSWORD, WORDS, seed, user_email
+
+#sql statements run by the current thread's request
+counter = threading.local()
+
+def _count_query(*args):
+    counter.queries = getattr(counter, 'queries', 0) + 1
+
+def _post_form(rng, zips):
+    return {
+        'title': ' '.join(rng.choice(WORDS) for _ in range(4)).title(),
+        'body': ' '.join(rng.choice(WORDS) for _ in range(60)),
+        'category': rng.choice(CATEGORIES),
+        'location_city': rng.choice(CITIES),
+        'location_zip': rng.choice(zips),
+        'location_name': 'Scoville Park',
+        'event_date': (datetime.date.today() + datetime.timedelta(days=rng.randint(0, 60))).isoformat(),
+        'event_time': '18:30',
+        'tags': ', '.join(f'tag-{rng.randint(0, 39)}' for _ in range(3)),
+    }
+
+#each scenario is (name, request function, expected status codes). a request
+#function gets the client's state and returns the response
+def _scenarios(zips):
+    def home(state):
+        return state['anonymous'].get('/')
+
+    def home_filtered(state):
+        return state['client'].get(f'/?category={state["rng"].choice(CATEGORIES)}&city={state["rng"].choice(CITIES)}')
+
+    def create(state):
+        return state['client'].post('/create', data=_post_form(state['rng'], zips))
+
+    def edit(state):
+        post_id = state['rng'].choice(state['posts'])
+        return state['client'].post(f'/edit-post/{post_id}', data=_post_form(state['rng'], zips))
+
+    def login(state):
+        return state['anonymous'].post('/login', data={'email': state['email'], 'password': PASSWORD})
+
+    #runs last, each client deletes its own posts
+    def delete(state):
+        return state['client'].post('/delete-post', json={'postId': state['posts'].pop()})
+
+    return [
+        ('GET /', home, (200,)),
+        ('GET /?filters', home_filtered, (200,)),
+        ('POST /create', create, (302,)),
+        ('POST /edit-post/<id>', edit, (302,)),
+        ('POST /login', login, (302,)),
+        ('POST /delete-post', delete, (200,)),
+    ]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def run_scenario(fn, expected, states, requests):
+    latencies = []
+    queries = []
+    errors = []
+    lock = threading.Lock()
+    per_client = [requests // len(states) + (i < requests % len(states)) for i in range(len(states))]
+
+    def client(state, count):
+        for _ in range(count):
+            counter.queries = 0
+            start = time.perf_counter()
+            try:
+                status = fn(state).status_code
+            except Exception as error:
+                status = type(error).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed * 1000)
+                queries.append(counter.queries)
+                if status not in expected:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=client, args=(state, count)) for state, count in zip(states, per_client)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'error_statuses': sorted({str(status) for status in errors}),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(max(latencies), 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args, tmp):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(tmp, "bench.db")}',
+        'PASSWORD_HASH_METHOD': args.hash_method,
+        'PASSWORD_HASH_WORKERS': args.hash_workers,
+        'PASSWORD_HASH_MAX_PENDING': args.concurrency,
+        'PASSWORD_HASH_QUEUE_TIMEOUT': 60,
+    })
+    users = max(args.users, args.concurrency)
+    with app.app_context():
+        started = time.perf_counter()
+        seed(users, args.posts, args.tags, seed=args.seed)
+        print(f'seeded {users} users and {args.posts} posts in {time.perf_counter() - started:.1f}s')
+        event.listen(db.engine, 'before_cursor_execute', _count_query)
+        zips = db.session.scalars(db.select(ZipCentroid.zip)).all() or ['']
+        user_ids = dict(db.session.execute(db.select(User.email, User.id)).all())
+        posts_by_user = {}
+        for post_id, user_id in db.session.execute(db.select(Post.id, Post.user_id)):
+            posts_by_user.setdefault(user_id, []).append(post_id)
+
+    states = []
+    for i in range(args.concurrency):
+        client = app.test_client()
+        response = client.post('/login', data={'email': user_email(i), 'password': PASSWORD})
+        assert response.status_code == 302, response.status_code
+        states.append({
+            'client': client,
+            'anonymous': app.test_client(),
+            'email': user_email(i),
+            'posts': posts_by_user.get(user_ids[user_email(i)], []),
+            'rng': random.Random(args.seed + i),
+        })
+
+    results = {}
+    for name, fn, expected in _scenarios(zips):
+        if name == 'POST /delete-post':
+            states_left = [state for state in states if state['posts']]
+            per_state = min([args.requests // max(len(states_left), 1)]
+                            + [len(state['posts']) for state in states_left])
+            requests = per_state * len(states_left)
+            result = run_scenario(fn, expected, states_left, requests) if requests else None
+        else:
+            result = run_scenario(fn, expected, states, args.requests)
+        if result:
+            results[name] = result
+
+    with app.app_context():
+        get_hasher().shutdown()
+    return results
+
+def print_results(results, baseline=None):
+    print(f'{"route":24} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"req/s":>8} {"errors":>7}')
+    for name, result in results.items():
+        line = (f'{name:24} {result["p50_ms"]:8.2f} {result["p95_ms"]:8.2f} {result["p99_ms"]:8.2f} '
+                f'{result["queries_per_request"]:8.2f} {result["requests_per_second"]:8.1f} {result["errors"]:7}')
+        old = (baseline or {}).get(name)
+        if old:
+            line += (f'   p95 {(result["p95_ms"] / old["p95_ms"] - 1) * 100:+.0f}%'
+                     f'  req/s {(result["requests_per_second"] / old["requests_per_second"] - 1) * 100:+.0f}%'
+                     f'  queries {result["queries_per_request"] - old["queries_per_request"]:+.2f}')
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--tags', type=int, default=40)
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    #cheap hashing by default so /login measures the app, not pbkdf2
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:1000')
+    parser.add_argument('--hash-workers', type=int, default=0)
+    parser.add_argument('--output', help='write results as json')
+    parser.add_argument('--compare', help='json from an earlier run to compare with')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run(args, tmp)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['routes']
+    print(f'{args.concurrency} concurrent clients, {args.requests} requests per route, {args.posts} posts')
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'commit': _git_commit(),
+                'run_at': datetime.datetime.now().isoformat(timespec='seconds'),
+                'settings': vars(args),
+                'routes': results,
+            }, file, indent=2)
+        print(f'wrote {args.output}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#times create_app() on a brand new database (schema + seed) and on an
+#existing one (version check only), run from the neighborly folder:
+#   python benchmarks/bench_startup.py --runs 20
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from website import create_app
+
+statements = []
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+def boot(db_path):
+    statements.clear()
+    start = time.perf_counter()
+    create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}'})
+    return (time.perf_counter() - start) * 1000, len(statements)
+
+def report(label, results):
+    times = [ms for ms, _ in results]
+    print(f'{label:<14} median {statistics.median(times):7.2f} ms   '
+          f'min {min(times):7.2f} ms   sql statements {results[0][1]}')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cold, warm = [], []
+        for run in range(args.runs):
+            db_path = os.path.join(tmp, f'cold-{run}.db')
+            cold.append(boot(db_path))
+            warm.append(boot(db_path))
+
+    report('new database', cold)
+    report('existing db', warm)
+
+if __name__ == '__main__':
+    main()
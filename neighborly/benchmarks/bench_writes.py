@@ -0,0 +1,106 @@
+#write throughput with several worker processes sharing one sqlite file, the
+#way a multi-worker server runs the app. compares the old setup (default
+#journal, deferred transactions, no retry) with database.py's WAL pragmas and
+#serialized writes. run from the neighborly folder:
+#   python benchmarks/bench_writes.py --processes 4 --threads 4 --seconds 5
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from website import create_app, db
+from website.models import Post, User
+from seed_data import PASSWORD, seed, user_email
+
+#settings that turn database.py's tuning off, for the baseline
+UNTUNED = {'SQLITE_PRAGMAS': {}, 'DB_SERIALIZE_WRITES': False}
+
+def _app(path, tuned):
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'PASSWORD_HASH_WORKERS': 0,
+        **({} if tuned else UNTUNED),
+    })
+
+#one worker process: each thread logs in as its own user and alternates
+#between creating a post and editing one of its posts
+def _worker(path, tuned, first_user, threads, seconds, results):
+    app = _app(path, tuned)
+    with app.app_context():
+        posts = {}
+        for i in range(first_user, first_user + threads):
+            user_id = db.session.scalar(db.select(User.id).where(User.email == user_email(i)))
+            posts[i] = db.session.scalars(db.select(Post.id).where(Post.user_id == user_id)).all()
+
+    counts = {'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(i):
+        http = app.test_client()
+        http.post('/login', data={'email': user_email(i), 'password': PASSWORD})
+        form = {'title': 'Benchmark post', 'body': 'write benchmark', 'category': 'event', 'tags': 'free, music'}
+        writes = errors = 0
+        while time.perf_counter() < deadline:
+            if writes % 2 and posts[i]:
+                response = http.post(f'/edit-post/{posts[i][writes % len(posts[i])]}', data=form)
+            else:
+                response = http.post('/create', data=form)
+            if response.status_code == 302:
+                writes += 1
+            else:
+                errors += 1
+        with lock:
+            counts['writes'] += writes
+            counts['errors'] += errors
+
+    pool = [threading.Thread(target=client, args=(i,)) for i in range(first_user, first_user + threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(counts)
+
+def run(tuned, args, tmp):
+    path = os.path.join(tmp, f'writes-{"tuned" if tuned else "untuned"}.db')
+    app = _app(path, tuned)
+    with app.app_context():
+        seed(args.processes * args.threads, args.posts)
+        db.engine.dispose()
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    workers = [context.Process(target=_worker,
+                               args=(path, tuned, p * args.threads, args.threads, args.seconds, results))
+               for p in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    counts = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return sum(c['writes'] for c in counts) / args.seconds, sum(c['errors'] for c in counts)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--posts', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        untuned = run(False, args, tmp)
+        tuned = run(True, args, tmp)
+
+    print(f'{args.processes} processes x {args.threads} threads writing for {args.seconds:g}s')
+    print(f'default sqlite settings  {untuned[0]:8.1f} writes/s  {untuned[1]:6} failed')
+    print(f'wal + serialized writes  {tuned[0]:8.1f} writes/s  {tuned[1]:6} failed')
+
+if __name__ == '__main__':
+    main()
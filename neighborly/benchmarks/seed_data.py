@@ -0,0 +1,102 @@
+#synthetic users, tags and posts for benchmarks, written straight into the
+#app's database with bulk inserts. used by bench_routes.py, or on its own:
+#   python benchmarks/seed_data.py --db /tmp/board.db --posts 50000
+import argparse
+import datetime
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from website import create_app, db
+from website.cache import bump_board_version
+from website.events import WEEKDAYS, rebuild_occurrences
+from website.facets import rebuild_facets
+from website.geo import locate_all_posts
+from website.models import Post, Tag, User, ZipCentroid, post_tags
+from website.passwords import get_hasher
+from website.tags import insert_ignore
+
+PASSWORD = 'benchmark-password'
+CHUNK_SIZE = 5000
+
+WORDS = ('open mic night community garden pickup soccer book club farmers market yoga in the park '
+         'trivia chess meetup volunteer cleanup art walk jazz concert running group bake sale '
+         'family movie craft fair dance class film screening board games coffee social').split()
+CATEGORIES = ['event', 'club', 'announcement']
+CITIES = ['Oak Park', 'Chicago', 'Evanston', 'Forest Park', 'River Forest', 'Berwyn']
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def _chunks(rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        yield rows[start:start + CHUNK_SIZE]
+
+def user_email(index):
+    return f'user{index}@example.com'
+
+def seed(users=50, posts=5000, tags=40, max_tags_per_post=4, seed=0):
+    rng = random.Random(seed)
+    password_hash = get_hasher().hash(PASSWORD)
+
+    db.session.execute(User.__table__.insert(), [
+        {'email': user_email(i), 'username': f'user{i}', 'first_name': f'User {i}', 'password': password_hash}
+        for i in range(users)
+    ])
+    db.session.execute(insert_ignore(Tag.__table__), [{'name': f'tag-{i}'} for i in range(tags)])
+    user_ids = db.session.scalars(db.select(User.id)).all()
+    tag_ids = db.session.scalars(db.select(Tag.id)).all()
+    zips = db.session.scalars(db.select(ZipCentroid.zip)).all() or [None]
+
+    now = datetime.datetime.utcnow()
+    today = datetime.date.today()
+    rows = []
+    for _ in range(posts):
+        recurring = rng.random() < 0.2
+        rows.append({
+            'title': _sentence(rng, 4).title(),
+            'body': _sentence(rng, 60),
+            'category': rng.choice(CATEGORIES),
+            'location_city': rng.choice(CITIES),
+            'location_zip': rng.choice(zips),
+            'location_name': _sentence(rng, 2).title(),
+            'event_date': None if recurring else today + datetime.timedelta(days=rng.randint(-30, 120)),
+            'event_day': rng.choice(WEEKDAYS) if recurring else None,
+            'event_time': datetime.time(rng.randint(8, 21), rng.choice([0, 30])),
+            'is_recurring': recurring,
+            'created_at': now - datetime.timedelta(seconds=rng.randint(0, 365 * 24 * 3600)),
+            'user_id': rng.choice(user_ids),
+        })
+    for chunk in _chunks(rows):
+        db.session.execute(Post.__table__.insert(), chunk)
+
+    post_ids = db.session.scalars(db.select(Post.id)).all()
+    links = [{'post_id': post_id, 'tag_id': tag_id}
+             for post_id in post_ids
+             for tag_id in rng.sample(tag_ids, rng.randint(0, min(max_tags_per_post, len(tag_ids))))]
+    for chunk in _chunks(links):
+        db.session.execute(post_tags.insert(), chunk)
+
+    locate_all_posts()
+    rebuild_facets()
+    bump_board_version()
+    rebuild_occurrences()
+    db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', required=True, help='sqlite file to create')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--tags', type=int, default=40)
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(args.db)}'})
+    with app.app_context():
+        seed(args.users, args.posts, args.tags)
+    print(f'Seeded {args.users} users, {args.posts} posts and {args.tags} tags into {args.db}')
+
+if __name__ == '__main__':
+    main()
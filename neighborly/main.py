@@ -1,9 +1,11 @@
 from website import create_app
 
-app = create_app()
+#spawned worker processes (the password hashing pool) import this file again
+#as __mp_main__, they shouldn't boot an app of their own
+if __name__ != '__mp_main__':
+    app = create_app()
 
 #only if the file __main__ is ran the web server will run (doesn't work for imports)
 if __name__ == '__main__':
     #runs the application and updates when code is changed
     app.run(debug=True)
-
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+
+from website import create_app, db
+from website.models import User
+
+#an app on its own throwaway database, hashing passwords inline
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "test.db"}',
+        'PASSWORD_HASH_WORKERS': 0,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'TESTING': True,
+    })
+    #uploads and other instance files go in the test's folder too
+    app.instance_path = str(tmp_path / 'instance')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+    app.extensions['neighborly_imports'].shutdown()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def user(app):
+    user = User(email='neighbor@example.com', first_name='Nell', username='nell',
+                password=generate_password_hash('secret12', 'pbkdf2:sha256:1000'))
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+@pytest.fixture
+def logged_in(client, user):
+    client.post('/login', data={'email': 'neighbor@example.com', 'password': 'secret12'})
+    return client
+
+#form fields for /create and /edit-post
+@pytest.fixture
+def post_form():
+    def form(**fields):
+        values = {'title': 'Community garden cleanup', 'body': 'Bring gloves', 'category': 'event',
+                  'location_city': 'Chicago', 'location_zip': '60601', 'location_name': 'Grant Park',
+                  'event_date': '', 'event_day': '', 'event_time': '', 'tags': ''}
+        values.update(fields)
+        return values
+    return form
@@ -0,0 +1,42 @@
+import json
+
+from website import db
+from website.facets import facet_counts, rebuild_facets
+from website.imports import queue_import
+from website.models import Post
+
+#the counts kept up to date by each change equal a full recount
+def assert_counts_match_a_rebuild():
+    db.session.rollback()
+    counts = facet_counts()
+    rebuild_facets()
+    assert facet_counts() == counts
+    db.session.rollback()
+    return counts
+
+def post_id(title):
+    return db.session.scalar(db.select(Post.id).where(Post.title == title))
+
+def test_counts_follow_create_edit_and_delete(app, logged_in, post_form, user):
+    logged_in.post('/create', data=post_form(title='Garden', tags='outdoor, free'))
+    logged_in.post('/create', data=post_form(title='Chess', category='club', tags='indoor, free'))
+    counts = assert_counts_match_a_rebuild()
+    assert counts == {'category': {'club': 1, 'event': 1},
+                      'tag': [('free', 2), ('indoor', 1), ('outdoor', 1)]}
+
+    #category changes, one tag kept, one dropped and one added
+    logged_in.post(f'/edit-post/{post_id("Garden")}', data=post_form(title='Garden', category='club',
+                                                                    tags='free, volunteering'))
+    counts = assert_counts_match_a_rebuild()
+    assert counts == {'category': {'club': 2},
+                      'tag': [('free', 2), ('indoor', 1), ('volunteering', 1)]}
+
+    logged_in.post('/delete-post', data=json.dumps({'postId': post_id('Chess')}))
+    counts = assert_counts_match_a_rebuild()
+    assert counts == {'category': {'club': 1}, 'tag': [('free', 1), ('volunteering', 1)]}
+
+    queue_import(user.id, 'posts.csv', b'title,category,tags\nPotluck,event,"food,free"\n')
+    app.extensions['neighborly_imports'].shutdown(wait=True)
+    counts = assert_counts_match_a_rebuild()
+    assert counts == {'category': {'club': 1, 'event': 1},
+                      'tag': [('food', 1), ('free', 2), ('volunteering', 1)]}
@@ -0,0 +1,56 @@
+import datetime
+
+from website import db
+from website.feed import get_feed_page
+from website.models import Post
+
+START = datetime.datetime(2026, 5, 1, 12, 0)
+
+def add_posts(user, count, created_at):
+    posts = [Post(title=f'Post {n}', body='', category='event', user_id=user.id, created_at=created_at(n))
+             for n in range(count)]
+    db.session.add_all(posts)
+    db.session.commit()
+    return [post.id for post in posts]
+
+def all_pages(limit, on_page=lambda number: None):
+    ids, cursor, number = [], None, 0
+    while True:
+        posts, cursor = get_feed_page(cursor, limit=limit)
+        ids += [post.id for post in posts]
+        number += 1
+        on_page(number)
+        if not cursor:
+            return ids
+
+def test_pages_cover_every_post_once_newest_first(app, user):
+    #several posts share a created_at, id breaks the tie
+    add_posts(user, 25, lambda n: START + datetime.timedelta(minutes=n // 3))
+    expected = [post.id for post in db.session.scalars(
+        db.select(Post).order_by(Post.created_at.desc(), Post.id.desc()))]
+    assert all_pages(4) == expected
+
+def test_new_posts_dont_shift_later_pages(app, user):
+    older = add_posts(user, 10, lambda n: START + datetime.timedelta(minutes=n))
+
+    #posts made while someone is paging don't repeat or skip older posts
+    def post_more(number):
+        add_posts(user, 3, lambda n: START + datetime.timedelta(days=number, minutes=n))
+
+    assert all_pages(3, post_more) == older[::-1]
+
+def test_api_cursor_matches_the_board(client, user):
+    add_posts(user, 7, lambda n: START + datetime.timedelta(minutes=n // 2))
+    ids, cursor = [], None
+    while True:
+        page = client.get('/api/posts', query_string={'limit': 3, **({'cursor': cursor} if cursor else {})}).get_json()
+        ids += [post['id'] for post in page['posts']]
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert ids == all_pages(3)
+
+def test_a_broken_cursor_starts_from_the_top(app, user):
+    add_posts(user, 3, lambda n: START + datetime.timedelta(minutes=n))
+    posts, _ = get_feed_page('not a cursor', limit=10)
+    assert len(posts) == 3
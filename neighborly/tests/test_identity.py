@@ -0,0 +1,22 @@
+from website import db
+from website.identity import _user_cache, load_session_user
+from website.models import User
+
+def test_a_change_drops_the_cached_user_when_committed(app, user):
+    load_session_user(user.id)
+    db.session.get(User, user.id).first_name = 'Nora'
+    db.session.flush()
+    #not committed yet, other requests still read the old row
+    assert _user_cache().get(user.id) is not None
+    db.session.commit()
+    assert _user_cache().get(user.id) is None
+    assert load_session_user(user.id).first_name == 'Nora'
+
+def test_a_rolled_back_change_keeps_the_cached_user(app, user):
+    load_session_user(user.id)
+    db.session.get(User, user.id).first_name = 'Nora'
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+    assert load_session_user(user.id).first_name == 'Nell'
+    assert _user_cache().get(user.id) is not None
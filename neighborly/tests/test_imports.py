@@ -0,0 +1,58 @@
+import json
+import os
+
+from website import db
+from website.imports import _upload_dir, fail_unfinished_imports, queue_import
+from website.models import ImportJob, Post
+
+def run(app, user, filename, data):
+    job = queue_import(user.id, filename, data)
+    #waits for the job to finish
+    app.extensions['neighborly_imports'].shutdown(wait=True)
+    #ends this session's read transaction so it sees the job's writes
+    db.session.rollback()
+    return db.session.get(ImportJob, job.id).to_dict()
+
+def test_bad_rows_are_reported_and_the_rest_imported(app, user):
+    rows = [
+        {'title': 'Book club', 'category': 'club', 'tags': ['books', 'Weekly']},
+        {'title': 'x', 'category': 'club'},
+        {'title': 'Garage sale', 'category': 'party'},
+        {'title': 'Numbers', 'category': 'event', 'tags': [1, 2]},
+        {'title': 'Run club', 'category': 'club', 'event_date': 'someday'},
+        {'title': 'Bake sale', 'category': 'event', 'tags': 'food, family-friendly'},
+    ]
+    job = run(app, user, 'posts.json', json.dumps(rows).encode())
+
+    assert job['status'] == 'done'
+    assert (job['total_rows'], job['processed_rows'], job['imported_rows'], job['failed_rows']) == (6, 6, 2, 4)
+    assert [error['row'] for error in job['errors']] == [2, 3, 4, 5]
+    assert 'tags' in job['errors'][2]['error']
+    assert sorted(db.session.scalars(db.select(Post.title))) == ['Bake sale', 'Book club']
+    assert not os.listdir(_upload_dir())
+
+def test_a_file_that_cant_be_read_fails_the_job(app, user):
+    job = run(app, user, 'posts.json', b'{"posts": "nope"}')
+    assert job['status'] == 'failed'
+    assert job['errors'] == [{'row': None, 'error': 'JSON files must hold a list of posts'}]
+
+def test_csv_imports(app, user):
+    data = b'title,category,tags\nPotluck,event,"food,outdoor"\n'
+    job = run(app, user, 'posts.csv', data)
+    assert (job['status'], job['imported_rows']) == ('done', 1)
+
+def test_jobs_cut_off_by_a_restart_are_failed(app, user):
+    jobs = [ImportJob(user_id=user.id, filename='posts.csv', status=status)
+            for status in ('queued', 'running', 'done')]
+    db.session.add_all(jobs)
+    db.session.commit()
+    for job in jobs:
+        with open(os.path.join(_upload_dir(), f'{job.id}.upload'), 'wb') as file:
+            file.write(b'title,category\n')
+
+    fail_unfinished_imports()
+
+    db.session.expire_all()
+    assert [db.session.get(ImportJob, job.id).status for job in jobs] == ['failed', 'failed', 'done']
+    assert 'restart' in json.loads(db.session.get(ImportJob, jobs[0].id).errors)[0]['error']
+    assert os.listdir(_upload_dir()) == [f'{jobs[2].id}.upload']
@@ -0,0 +1,16 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from website.passwords import PasswordHasher
+
+@pytest.mark.parametrize('method', ['scrypt', 'scrypt:16384:8:1', 'pbkdf2', 'pbkdf2:sha256', 'pbkdf2:sha256:1000'])
+def test_a_fresh_hash_does_not_need_a_rehash(method):
+    hasher = PasswordHasher(method, workers=0)
+    assert not hasher.needs_rehash(generate_password_hash('secret12', method))
+    assert not hasher.needs_rehash(hasher.hash('secret12'))
+    assert hasher.verify(hasher.hash('secret12'), 'secret12')
+
+def test_hashes_made_with_other_settings_need_a_rehash():
+    hasher = PasswordHasher('pbkdf2:sha256:2000', workers=0)
+    assert hasher.needs_rehash(generate_password_hash('secret12', 'pbkdf2:sha256:1000'))
+    assert hasher.needs_rehash(generate_password_hash('secret12', 'scrypt'))
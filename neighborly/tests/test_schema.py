@@ -0,0 +1,86 @@
+import datetime
+import sqlite3
+
+from sqlalchemy import text
+
+from website import create_app, db
+from website.facets import facet_counts
+from website.models import EventOccurrence, Post, Tag
+from website.schema import SCHEMA_VERSION, SEED_VERSION, stored_versions
+from website.search import search_posts
+
+#the tables as the app created them before versioned upgrades
+BASELINE_SCHEMA = [
+    '''CREATE TABLE user (
+        id INTEGER NOT NULL, email VARCHAR(150), password VARCHAR(150), first_name VARCHAR(150),
+        username VARCHAR(50), bio TEXT, instagram_url VARCHAR(300), tiktok_url VARCHAR(300),
+        twitter_url VARCHAR(300), website_url VARCHAR(300),
+        PRIMARY KEY (id), UNIQUE (email), UNIQUE (username)
+    )''',
+    '''CREATE TABLE tag (id INTEGER NOT NULL, name VARCHAR(50) NOT NULL, PRIMARY KEY (id), UNIQUE (name))''',
+    '''CREATE TABLE post (
+        id INTEGER NOT NULL, title VARCHAR(150) NOT NULL, body TEXT NOT NULL, category VARCHAR(50),
+        location_city VARCHAR(100), location_zip VARCHAR(20), location_name VARCHAR(150),
+        event_date DATE, event_day VARCHAR(20), event_time TIME, is_recurring BOOLEAN,
+        instagram_url VARCHAR(300), group_chat_url VARCHAR(300), contact_email VARCHAR(150),
+        created_at DATETIME, user_id INTEGER,
+        PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id)
+    )''',
+    '''CREATE TABLE post_tags (
+        post_id INTEGER, tag_id INTEGER,
+        FOREIGN KEY(post_id) REFERENCES post (id), FOREIGN KEY(tag_id) REFERENCES tag (id)
+    )''',
+]
+
+def make_baseline_database(path):
+    with sqlite3.connect(path) as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(statement)
+        conn.execute("INSERT INTO user (id, email, password, first_name, username) "
+                     "VALUES (1, 'old@example.com', 'x', 'Olive', 'olive')")
+        conn.executemany("INSERT INTO tag (id, name) VALUES (?, ?)", [(1, 'free'), (2, 'chess')])
+        conn.executemany(
+            "INSERT INTO post (id, title, body, category, location_zip, event_date, event_day, is_recurring, "
+            "created_at, user_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)",
+            [(1, 'Chess club', 'Every week', 'club', '60601', None, 'tuesday', 1, '2024-01-01 10:00:00.000000'),
+             (2, 'Street fair', 'Food and music', 'event', '99999', '2024-06-01', None, 0,
+              '2024-01-02 10:00:00.000000')],
+        )
+        conn.executemany("INSERT INTO post_tags (post_id, tag_id) VALUES (?, ?)", [(1, 1), (1, 2), (2, 1)])
+    conn.close()
+
+def boot(path):
+    return create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'PASSWORD_HASH_WORKERS': 0})
+
+def test_upgrades_a_baseline_database(tmp_path):
+    path = tmp_path / 'database.db'
+    make_baseline_database(path)
+    app = boot(path)
+
+    with app.app_context():
+        assert stored_versions() == {'schema_version': SCHEMA_VERSION, 'seed_version': SEED_VERSION}
+        #existing rows are kept and filled in
+        posts = {post.id: post for post in db.session.scalars(db.select(Post))}
+        assert sorted(post.title for post in posts.values()) == ['Chess club', 'Street fair']
+        assert posts[1].geo_cell is not None and posts[2].geo_cell is None
+        assert [post.title for post in search_posts('chess')[0]] == ['Chess club']
+        assert facet_counts() == {'category': {'club': 1, 'event': 1}, 'tag': [('chess', 1), ('free', 2)]}
+        assert db.session.scalar(db.select(db.func.count()).select_from(Tag)) > 2
+        occurrences = db.session.scalars(
+            db.select(EventOccurrence.occurs_on).where(EventOccurrence.post_id == 1)).all()
+        assert occurrences and all(day.weekday() == 1 for day in occurrences)
+        assert db.session.scalar(db.select(EventOccurrence.occurs_on).where(EventOccurrence.post_id == 2)) \
+            == datetime.date(2024, 6, 1)
+        schema_cookie = db.session.execute(text('PRAGMA schema_version')).scalar()
+        db.session.remove()
+        db.engine.dispose()
+    app.extensions['neighborly_imports'].shutdown()
+
+    #the next boot finds the versions current and changes nothing
+    app = boot(path)
+    with app.app_context():
+        assert db.session.execute(text('PRAGMA schema_version')).scalar() == schema_cookie
+        assert stored_versions() == {'schema_version': SCHEMA_VERSION, 'seed_version': SEED_VERSION}
+        db.session.remove()
+        db.engine.dispose()
+    app.extensions['neighborly_imports'].shutdown()
@@ -0,0 +1,53 @@
+import json
+
+from sqlalchemy import text
+
+from website import db
+from website.models import Post
+from website.search import rebuild_search_index, search_posts
+
+def titles(q):
+    return [post.title for post in search_posts(q)[0]]
+
+def index_rows():
+    return db.session.execute(text(
+        'SELECT rowid, title, body, location_name, tags FROM post_fts ORDER BY rowid')).all()
+
+#what the triggers left in the index is what a full rebuild would write
+def assert_index_in_sync():
+    db.session.rollback()
+    rows = index_rows()
+    with db.engine.begin() as conn:
+        rebuild_search_index(conn)
+    assert index_rows() == rows
+
+def test_index_follows_create_edit_and_delete(logged_in, post_form):
+    logged_in.post('/create', data=post_form(tags='outdoor, volunteering'))
+    logged_in.post('/create', data=post_form(title='Chess night', body='All levels', location_name='Cafe',
+                                             tags='indoor'))
+    garden = db.session.scalar(db.select(Post.id).where(Post.title == 'Community garden cleanup'))
+    assert titles('garden') == ['Community garden cleanup']
+    assert titles('volunteer') == ['Community garden cleanup']
+    assert titles('gloves grant') == ['Community garden cleanup']
+    assert_index_in_sync()
+
+    logged_in.post(f'/edit-post/{garden}', data=post_form(title='Library book swap', body='Bring a book',
+                                                           location_name='Harold Washington', tags='arts'))
+    db.session.rollback()
+    assert titles('garden') == []
+    assert titles('volunteering') == []
+    assert titles('library') == ['Library book swap']
+    assert titles('arts') == ['Library book swap']
+    assert_index_in_sync()
+
+    logged_in.post('/delete-post', data=json.dumps({'postId': garden}))
+    db.session.rollback()
+    assert titles('library') == []
+    assert titles('chess') == ['Chess night']
+    assert_index_in_sync()
+
+def test_search_page(logged_in, post_form):
+    logged_in.post('/create', data=post_form())
+    page = logged_in.get('/search', query_string={'q': 'gard'})
+    assert page.status_code == 200
+    assert b'Community garden cleanup' in page.data
@@ -1,31 +1,55 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from os import path
-import os
 from flask_login import LoginManager
 
 db = SQLAlchemy()
 DB_NAME = "database.db"
 
-def create_app():
+def create_app(config=None):
     #initializing flask (__name__ is file name)
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'the secret key'
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_NAME}'
+    #DATABASE_URL in the environment points at another database (see database.py)
+    from .database import configure_database, database_url, init_database
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url(f'sqlite:///{DB_NAME}')
+    #overrides for tests and benchmarks, e.g. a throwaway database
+    app.config.update(config or {})
+    configure_database(app)
     db.init_app(app)
+    init_database(app)
+
+    #board page cache, see cache.py for plugging in another backend
+    from .cache import init_cache
+    from .tags import init_tag_cache
+    from .identity import init_user_cache
+    from .passwords import init_password_hasher
+    from .metrics import init_metrics
+    from .imports import init_imports
+    init_cache(app)
+    init_tag_cache(app)
+    init_user_cache(app)
+    init_password_hasher(app)
+    #request timings and sql counts, served at /metrics
+    init_metrics(app)
 
     #import blueprints
     from .views import views
     from .auth import auth
+    from .api import api
     
     #urls stored inside blueprint file accessed with / (which means no prefix)
     app.register_blueprint(views, url_prefix='/')
     app.register_blueprint(auth, url_prefix='/')
+    app.register_blueprint(api, url_prefix='/api')
 
-    #define classes before creating database 
-    from .models import User, Post, Tag
+    from .identity import load_session_user
 
     create_database(app)
+    #background workers for bulk post imports
+    init_imports(app)
+
+    from .geo import register_commands
+    register_commands(app)
 
     login_manager = LoginManager()
     #if user isn't logged in- redirect
@@ -34,21 +58,12 @@ def create_app():
 
     @login_manager.user_loader
     def load_user(id):
-        #looks for primary key and checks against id
-        return User.query.get(int(id))
+        #looks for primary key and checks against id (cached, see identity.py)
+        return load_session_user(int(id))
 
     return app
 
 def create_database(app):
     with app.app_context():
-        db.create_all()
-        print('Created Database!')
-
-        from .models import Tag
-        default_tags = ['free', 'outdoor', 'indoor', 'family-friendly',
-                        '18+', 'sports', 'music', 'food', 'fitness',
-                        'arts', 'volunteering', 'weekly', 'one-time']
-        for name in default_tags:
-            if not Tag.query.filter_by(name=name).first():
-                db.session.add(Tag(name=name))
-        db.session.commit()
+        from .schema import ensure_database
+        ensure_database()
@@ -0,0 +1,117 @@
+import datetime
+import json
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from flask_login import current_user, login_required
+
+from . import db
+from .events import occurrences_between
+from .geo import nearest_posts, zip_location
+from .feed import (FEED_ORDER, PAGE_SIZE, after_cursor, apply_filters, encode_cursor, fetch_page, parse_filters,
+                   within_radius)
+from .models import ImportJob, Post, User, serialize_post
+from .tags import tag_names_for_posts
+
+api = Blueprint('api', __name__)
+
+MAX_PAGE_SIZE = 100
+STREAM_BATCH_SIZE = 500
+
+#only the columns serialize_post needs, so rows come back as plain tuples
+#instead of ORM objects with lazy relationships
+POST_COLUMNS = (
+    Post.id, Post.title, Post.body, Post.category,
+    Post.location_city, Post.location_zip, Post.location_name,
+    Post.event_date, Post.event_day, Post.event_time, Post.is_recurring,
+    Post.instagram_url, Post.group_chat_url, Post.created_at,
+    Post.latitude, Post.longitude,
+    User.username.label('author_username'), User.first_name.label('author_first_name'),
+)
+
+def _posts_query(filters, cursor=None):
+    query = db.select(*POST_COLUMNS).outerjoin(User, User.id == Post.user_id)
+    return after_cursor(apply_filters(query, filters), cursor).order_by(*FEED_ORDER)
+
+def _serialize(rows):
+    tags = tag_names_for_posts([row.id for row in rows])
+    return [serialize_post(row, tags[row.id], row.author_username or row.author_first_name)
+            for row in rows]
+
+#board posts as json, same filters as the board
+#?format=json (default) returns one page with a cursor for the next one,
+#?format=ndjson streams every matching post, one json object per line
+@api.route('/posts', methods=['GET'])
+def posts():
+    filters = parse_filters(request.args)
+    cursor = request.args.get('cursor')
+
+    if request.args.get('format') == 'ndjson':
+        return Response(stream_with_context(_stream_posts(filters, cursor)),
+                        mimetype='application/x-ndjson')
+
+    limit = request.args.get('limit', PAGE_SIZE, type=int)
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    rows = fetch_page(lambda cursor, count: db.session.execute(_posts_query(filters, cursor).limit(count)).all(),
+                      cursor, limit + 1, filters)
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return jsonify({'posts': _serialize(rows[:limit]), 'next_cursor': next_cursor})
+
+#reads the result in batches so memory stays flat however big the board is
+def _stream_posts(filters, cursor):
+    result = db.session.execute(_posts_query(filters, cursor).execution_options(yield_per=STREAM_BATCH_SIZE))
+    for rows in result.partitions():
+        rows = within_radius(rows, filters)
+        if rows:
+            yield ''.join(json.dumps(post) + '\n' for post in _serialize(rows))
+
+#event occurrences between ?start= and ?end= (YYYY-MM-DD, at most 92 days)
+@api.route('/calendar', methods=['GET'])
+def calendar():
+    try:
+        start = datetime.date.fromisoformat(request.args.get('start', ''))
+        end = datetime.date.fromisoformat(request.args.get('end', ''))
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates (YYYY-MM-DD)'}), 400
+    if end < start or (end - start).days > 92:
+        return jsonify({'error': 'end must be after start and at most 92 days later'}), 400
+
+    return jsonify({'events': [{
+        'date':          row.occurs_on.isoformat(),
+        'time':          str(row.starts_at) if row.starts_at else None,
+        'post_id':       row.id,
+        'title':         row.title,
+        'category':      row.category,
+        'location_name': row.location_name,
+        'location_city': row.location_city,
+    } for row in occurrences_between(start, end)]})
+
+#the ?limit= nearest posts to ?near=<zip> or ?lat=&lon=, with distances
+@api.route('/posts/nearby', methods=['GET'])
+def nearby_posts():
+    filters = parse_filters(request.args)
+    if 'lat' in filters:
+        center = filters['lat'], filters['lon']
+    else:
+        center = zip_location(filters.get('near'))
+    if center is None:
+        return jsonify({'error': 'pass a known zip as near, or lat and lon'}), 400
+
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    nearest = nearest_posts(*center, limit)
+    miles = dict(nearest)
+    rows = db.session.execute(db.select(*POST_COLUMNS).outerjoin(User, User.id == Post.user_id)
+                              .where(Post.id.in_(miles))).all()
+    rows.sort(key=lambda row: miles[row.id])
+    posts = _serialize(rows)
+    for post in posts:
+        post['distance_miles'] = round(miles[post['id']], 2)
+    return jsonify({'posts': posts})
+
+#progress of one of your bulk imports (see imports.py)
+@api.route('/imports/<int:id>', methods=['GET'])
+@login_required
+def import_status(id):
+    job = db.session.get(ImportJob, id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify({'error': 'no such import'}), 404
+    return jsonify(job.to_dict())
@@ -1,7 +1,8 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for
 from .models import User
-from werkzeug.security import generate_password_hash, check_password_hash
 #not storing password in plain text - hash (can't use to get real password)
+from .passwords import HashingBusy, get_hasher
+from .database import write_transaction
 from . import db
 from flask_login import login_user, login_required, logout_user, current_user
 
@@ -11,6 +12,11 @@ auth = Blueprint('auth', __name__)
 def home():
     return render_template("home.html")
 
+#too many logins/sign ups are hashing at once, ask the user to retry
+def _busy(template):
+    flash('The server is busy right now, please try again in a moment.', category='error')
+    return render_template(template, user=current_user), 503
+
 @auth.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -20,7 +26,22 @@ def login():
         #look for specific entries in database
         user = User.query.filter_by(email=email).first()
         if user:
-            if check_password_hash(user.password, password):
+            hasher = get_hasher()
+            try:
+                password_ok = hasher.verify(user.password, password)
+            except HashingBusy:
+                return _busy("login.html")
+            if password_ok:
+                #upgrade hashes made with older settings while we have the password
+                if hasher.needs_rehash(user.password):
+                    try:
+                        password_hash = hasher.hash(password)
+                    except HashingBusy:
+                        password_hash = None
+                    if password_hash:
+                        def rehash():
+                            user.password = password_hash
+                        write_transaction(rehash)
                 flash('Logged in successfully!', category='success')
                 login_user(user, remember=True)
                 return redirect(url_for('views.home'))
@@ -63,9 +84,17 @@ def sign_up():
         elif User.query.filter_by(username=username).first():
             flash('Username already taken.', category='error')
         else:
-            new_user = User(email=email, first_name=first_name, username=username, password=generate_password_hash(password1, method='pbkdf2:sha256'))
-            db.session.add(new_user)
-            db.session.commit()
+            try:
+                password_hash = get_hasher().hash(password1)
+            except HashingBusy:
+                return _busy("sign_up.html")
+
+            def save():
+                new_user = User(email=email, first_name=first_name, username=username, password=password_hash)
+                db.session.add(new_user)
+                return new_user
+
+            new_user = write_transaction(save)
             login_user(new_user, remember=True)
             flash('Account created!', category='success')
             return redirect(url_for('views.home'))
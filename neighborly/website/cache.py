@@ -0,0 +1,87 @@
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from . import db
+from .models import BoardState
+
+#default cache backend, any object with get/set/clear can be plugged in
+#through app.config['CACHE_BACKEND']. entries can also expire after ttl
+#seconds, and hits/misses are counted for stats()
+class LRUCache:
+    def __init__(self, maxsize=512, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry[1] is not None and entry[1] < time.monotonic()):
+                self._data.pop(key, None)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+def init_cache(app):
+    backend = app.config.get('CACHE_BACKEND')
+    #backend is a factory that takes the app, so it can read its own settings
+    cache = backend(app) if backend else LRUCache(app.config.get('CACHE_MAX_ENTRIES', 512))
+    app.extensions['neighborly_cache'] = cache
+
+def get_cache():
+    return current_app.extensions['neighborly_cache']
+
+#returns the cached value for key or builds and stores it
+def cached(key, build):
+    cache = get_cache()
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value)
+    return value
+
+def get_board_state():
+    state = db.session.get(BoardState, 1)
+    if state is None:
+        state = BoardState(id=1, version=0)
+        db.session.add(state)
+        db.session.commit()
+    return state.version, state.updated_at
+
+#called by every write to posts before it commits, so the new version lands
+#in the same transaction and all workers stop serving the old pages
+def bump_board_version():
+    db.session.execute(
+        db.update(BoardState)
+        .where(BoardState.id == 1)
+        .values(version=BoardState.version + 1, updated_at=datetime.datetime.utcnow())
+    )
@@ -0,0 +1,127 @@
+import datetime
+
+from flask import current_app
+
+from . import db
+from .database import write_transaction
+from .models import AppMeta, EventOccurrence, Post
+from .tags import insert_ignore
+
+#how far ahead weekly events are expanded (app.config['OCCURRENCE_HORIZON_DAYS'])
+OCCURRENCE_HORIZON_DAYS = 90
+MAX_CALENDAR_ROWS = 500
+
+#post columns needed to expand a post's dates
+DATE_COLUMNS = (Post.id, Post.event_date, Post.event_day, Post.event_time, Post.is_recurring)
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+def _horizon_days():
+    return current_app.config.get('OCCURRENCE_HORIZON_DAYS', OCCURRENCE_HORIZON_DAYS)
+
+#dates a post happens on between start and end (inclusive). one-off events
+#keep their date wherever it falls, weekly ones repeat on their day
+def expand_dates(post, start, end):
+    if not post.is_recurring:
+        return [post.event_date] if post.event_date else []
+
+    if post.event_day in WEEKDAYS:
+        weekday = WEEKDAYS.index(post.event_day)
+    elif post.event_date:
+        weekday = post.event_date.weekday()
+    else:
+        return []
+
+    first = max(start, post.event_date) if post.event_date else start
+    first += datetime.timedelta(days=(weekday - first.weekday()) % 7)
+    dates = []
+    while first <= end:
+        dates.append(first)
+        first += datetime.timedelta(days=7)
+    return dates
+
+def _occurrence_rows(posts, start, end):
+    return [{'post_id': post.id, 'occurs_on': day, 'starts_at': post.event_time}
+            for post in posts for day in expand_dates(post, start, end)]
+
+def _post_dates(post_ids):
+    return db.session.execute(db.select(*DATE_COLUMNS).where(Post.id.in_(post_ids))).all()
+
+def _through():
+    value = db.session.get(AppMeta, 'occurrences_through')
+    return datetime.date.fromisoformat(value.value) if value else None
+
+def _set_through(day):
+    db.session.execute(AppMeta.__table__.delete().where(AppMeta.key == 'occurrences_through'))
+    db.session.add(AppMeta(key='occurrences_through', value=day.isoformat()))
+
+def delete_occurrences(post_ids):
+    db.session.execute(EventOccurrence.__table__.delete().where(EventOccurrence.post_id.in_(post_ids)))
+
+#called by create/edit (before commit) to redo just those posts' rows,
+#delete_post calls delete_occurrences before removing the post
+def sync_occurrences(post_ids):
+    delete_occurrences(post_ids)
+    today = datetime.date.today()
+    rows = _occurrence_rows(_post_dates(post_ids), today, _through() or today + datetime.timedelta(days=_horizon_days()))
+    if rows:
+        db.session.execute(EventOccurrence.__table__.insert(), rows)
+
+#rebuilds the whole table, used when the table is first created. the caller
+#commits (schema.py runs it in a write_transaction)
+def rebuild_occurrences():
+    db.session.execute(EventOccurrence.__table__.delete())
+    today = datetime.date.today()
+    through = today + datetime.timedelta(days=_horizon_days())
+    posts = db.session.execute(
+        db.select(*DATE_COLUMNS).where(Post.event_date.is_not(None) | Post.is_recurring.is_(True))
+    ).all()
+    rows = _occurrence_rows(posts, today, through)
+    if rows:
+        db.session.execute(EventOccurrence.__table__.insert(), rows)
+    _set_through(through)
+
+#moves the horizon forward as days pass by only adding the new weeks of
+#recurring events. checked before reading occurrences, once per day per worker
+def extend_horizon():
+    today = datetime.date.today()
+    if current_app.extensions.get('neighborly_occurrences_checked') == today:
+        return
+    target = today + datetime.timedelta(days=_horizon_days())
+    through = _through()
+    if through is None or through < target:
+        def extend():
+            #read again holding the write lock, another worker may have
+            #extended it since
+            through = _through()
+            if through is not None and through >= target:
+                return
+            start = max(through + datetime.timedelta(days=1), today) if through else today
+            posts = db.session.execute(db.select(*DATE_COLUMNS).where(Post.is_recurring.is_(True))).all()
+            rows = _occurrence_rows(posts, start, target)
+            if rows:
+                db.session.execute(insert_ignore(EventOccurrence.__table__), rows)
+            _set_through(target)
+
+        write_transaction(extend)
+    current_app.extensions['neighborly_occurrences_checked'] = today
+
+#occurrences in [start, end] with their posts, in date/time order
+def occurrences_between(start, end, limit=MAX_CALENDAR_ROWS):
+    extend_horizon()
+    return db.session.execute(
+        db.select(EventOccurrence.occurs_on, EventOccurrence.starts_at,
+                  Post.id, Post.title, Post.category, Post.location_name, Post.location_city)
+        .join(Post, Post.id == EventOccurrence.post_id)
+        .where(EventOccurrence.occurs_on.between(start, end))
+        .order_by(EventOccurrence.occurs_on, EventOccurrence.starts_at, Post.id)
+        .limit(limit)
+    ).all()
+
+#saturday and sunday of this week (just today if it's already sunday)
+def this_weekend(today=None):
+    today = today or datetime.date.today()
+    saturday = today + datetime.timedelta(days=(5 - today.weekday()) % 7)
+    if today.weekday() == 6:
+        return today, today
+    return saturday, saturday + datetime.timedelta(days=1)
@@ -0,0 +1,76 @@
+from . import db
+from .models import FacetCount, Post, Tag, post_tags
+from .tags import insert_ignore
+
+#post counts per tag and category are kept in facet_count instead of being
+#grouped on every page view. writes adjust them before they commit (like
+#bump_board_version), rebuild_facets recounts everything from scratch
+
+#recounts every tag and category in one aggregate query
+def rebuild_facets():
+    tag_counts = (
+        db.select(db.literal('tag'), Tag.name, db.func.count())
+        .select_from(post_tags).join(Tag, Tag.id == post_tags.c.tag_id)
+        .group_by(Tag.name)
+    )
+    category_counts = (
+        db.select(db.literal('category'), Post.category, db.func.count())
+        .where(Post.category.is_not(None))
+        .group_by(Post.category)
+    )
+    db.session.execute(FacetCount.__table__.delete())
+    db.session.execute(FacetCount.__table__.insert().from_select(
+        ['kind', 'value', 'count'], db.union_all(tag_counts, category_counts)))
+
+#{(kind, value): delta} for a post's category and tag names
+def post_facets(category, tag_names, delta=1):
+    deltas = {('tag', name): delta for name in tag_names}
+    deltas[('category', category)] = delta
+    return deltas
+
+#adds {(kind, value): delta} to the counts, two statements however many
+#values change
+def adjust_facets(deltas):
+    deltas = {key: delta for key, delta in deltas.items() if key[1] and delta}
+    if not deltas:
+        return
+    table = FacetCount.__table__
+    db.session.execute(insert_ignore(table), [{'kind': kind, 'value': value, 'count': 0} for kind, value in deltas])
+    db.session.execute(
+        db.update(table)
+        .where(table.c.kind == db.bindparam('facet_kind'), table.c.value == db.bindparam('facet_value'))
+        .values(count=table.c.count + db.bindparam('delta')),
+        [{'facet_kind': kind, 'facet_value': value, 'delta': delta} for (kind, value), delta in deltas.items()],
+    )
+
+#deltas for set_post_tags' (added, removed) tag ids, one query when anything changed
+def tag_facet_changes(added, removed):
+    if not added and not removed:
+        return {}
+    names = dict(db.session.execute(db.select(Tag.id, Tag.name).where(Tag.id.in_(added | removed))).all())
+    deltas = {('tag', names[tag_id]): 1 for tag_id in added}
+    deltas.update({('tag', names[tag_id]): -1 for tag_id in removed})
+    return deltas
+
+#call before deleting a post, takes its category and tags off the counts
+def remove_post_facets(post):
+    names = db.session.scalars(
+        db.select(Tag.name).join(post_tags, post_tags.c.tag_id == Tag.id).where(post_tags.c.post_id == post.id)
+    ).all()
+    adjust_facets(post_facets(post.category, names, -1))
+
+#{'category': {value: count}, 'tag': [(name, count)]} for everything in use,
+#tags in name order
+def facet_counts():
+    counts = {'category': {}, 'tag': []}
+    rows = db.session.execute(
+        db.select(FacetCount.kind, FacetCount.value, FacetCount.count)
+        .where(FacetCount.count > 0)
+        .order_by(FacetCount.kind, FacetCount.value)
+    )
+    for kind, value, count in rows:
+        if kind == 'category':
+            counts['category'][value] = count
+        elif kind == 'tag':
+            counts['tag'].append((value, count))
+    return counts
@@ -0,0 +1,152 @@
+import base64
+import datetime
+
+import numpy as np
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import joinedload, selectinload
+
+from . import db
+from .geo import DEFAULT_RADIUS_MILES, MAX_RADIUS_MILES, distances_miles, near, normalize_zip, zip_location
+from .models import Post, Tag, post_tags
+
+PAGE_SIZE = 24
+FILTER_KEYS = ('category', 'tag', 'city', 'zip', 'day', 'date_from', 'date_to')
+#"near me" filters: a zip (near) or browser coordinates (lat, lon) plus radius in miles
+NEAR_KEYS = ('near', 'lat', 'lon', 'radius')
+
+#cursor is the (created_at, id) of the last post on a page, so the next page
+#starts right after it without counting rows like OFFSET does
+def encode_cursor(post):
+    raw = f'{post.created_at.isoformat()}|{post.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, post_id = raw.split('|')
+        return datetime.datetime.fromisoformat(created_at), int(post_id)
+    except (ValueError, UnicodeError):
+        return None
+
+def _parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+#reads board filters from query args, dropping blank or invalid ones
+def parse_filters(args):
+    filters = {}
+    for key in FILTER_KEYS:
+        value = (args.get(key) or '').strip()
+        if not value:
+            continue
+        if key in ('date_from', 'date_to'):
+            value = _parse_date(value)
+            if value is None:
+                continue
+        elif key in ('category', 'tag', 'day'):
+            value = value.lower()
+        filters[key] = value
+
+    near = normalize_zip(args.get('near'))
+    latitude = _parse_float(args.get('lat'), -90, 90)
+    longitude = _parse_float(args.get('lon'), -180, 180)
+    if latitude is not None and longitude is not None:
+        filters['lat'], filters['lon'] = latitude, longitude
+    elif near:
+        filters['near'] = near
+    if 'near' in filters or 'lat' in filters:
+        radius = _parse_float(args.get('radius'), 0.5, MAX_RADIUS_MILES)
+        filters['radius'] = radius or DEFAULT_RADIUS_MILES
+    return filters
+
+def _parse_float(value, low, high):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if low <= value <= high else None
+
+#all filters are ANDed together, each one matches an index on post/post_tags
+def apply_filters(query, filters):
+    if 'category' in filters:
+        query = query.filter(Post.category == filters['category'])
+    if 'tag' in filters:
+        tagged = (db.select(post_tags.c.post_id)
+                  .join(Tag, Tag.id == post_tags.c.tag_id)
+                  .where(Tag.name == filters['tag']))
+        query = query.filter(Post.id.in_(tagged))
+    if 'city' in filters:
+        query = query.filter(func.lower(Post.location_city) == filters['city'].lower())
+    if 'zip' in filters:
+        query = query.filter(Post.location_zip == filters['zip'])
+    if 'day' in filters:
+        query = query.filter(Post.event_day == filters['day'])
+    if 'date_from' in filters:
+        query = query.filter(Post.event_date >= filters['date_from'])
+    if 'date_to' in filters:
+        query = query.filter(Post.event_date <= filters['date_to'])
+    if 'radius' in filters:
+        center = radius_center(filters)
+        #the grid index and a bounding box narrow it to nearby posts, the
+        #exact distance is checked on the rows fetched (within_radius)
+        query = query.filter(near(*center, filters['radius']) if center else db.false())
+    return query
+
+#(latitude, longitude) of a radius filter, None for a zip we don't know
+def radius_center(filters):
+    if 'lat' in filters:
+        return filters['lat'], filters['lon']
+    return zip_location(filters['near'])
+
+#drops the rows (posts, or rows with latitude and longitude) in the corners
+#of the radius filter's bounding box
+def within_radius(rows, filters):
+    if 'radius' not in filters or not rows:
+        return rows
+    distances = distances_miles(*radius_center(filters),
+                                np.array([row.latitude for row in rows]),
+                                np.array([row.longitude for row in rows]))
+    return [row for row, miles in zip(rows, distances) if miles <= filters['radius']]
+
+#up to count rows after cursor, fetch(cursor, count) runs the filtered query.
+#rows outside the radius are dropped and the next rows fetched in their place
+def fetch_page(fetch, cursor, count, filters):
+    rows = []
+    while True:
+        batch = fetch(cursor, count)
+        rows += within_radius(batch, filters)
+        if len(rows) >= count or len(batch) < count:
+            return rows[:count]
+        cursor = encode_cursor(batch[-1])
+
+#newest first, id breaks ties between posts created at the same time
+FEED_ORDER = (Post.created_at.desc(), Post.id.desc())
+
+#keeps only posts that come after the cursor in FEED_ORDER
+def after_cursor(query, cursor):
+    position = decode_cursor(cursor)
+    if position:
+        created_at, post_id = position
+        query = query.filter(or_(
+            Post.created_at < created_at,
+            and_(Post.created_at == created_at, Post.id < post_id),
+        ))
+    return query
+
+def get_feed_page(cursor=None, limit=PAGE_SIZE, filters=None):
+    #author is joined into the same query and tags come from one IN query,
+    #so rendering a page never lazy loads per post
+    filters = filters or {}
+    query = apply_filters(Post.query.options(joinedload(Post.author), selectinload(Post.tags)), filters)
+
+    def fetch(cursor, count):
+        return after_cursor(query, cursor).order_by(*FEED_ORDER).limit(count).all()
+
+    #fetch one extra row to know if there is another page
+    posts = fetch_page(fetch, cursor, limit + 1, filters)
+    next_cursor = encode_cursor(posts[limit - 1]) if len(posts) > limit else None
+    return posts[:limit], next_cursor
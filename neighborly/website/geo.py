@@ -0,0 +1,158 @@
+import csv
+import math
+import os
+
+import click
+import numpy as np
+
+from . import db
+from .models import Post, ZipCentroid
+
+#bundled zip centers (a starter set for the Chicago area). the full US list
+#is the census ZCTA gazetteer file, load it with: flask --app main load-zips <file>
+ZIP_CENTROIDS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'zip_centroids.csv')
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = 69.0
+
+#posts are bucketed into a grid of CELL_DEGREES squares (about 7 x 5 miles
+#here), a radius search only reads posts in the cells its circle touches
+CELL_DEGREES = 0.1
+CELLS_PER_ROW = 4000
+
+DEFAULT_RADIUS_MILES = 5
+MAX_RADIUS_MILES = 100
+
+def normalize_zip(value):
+    value = (value or '').strip()[:5]
+    return value if len(value) == 5 and value.isdigit() else None
+
+def _cell_index(latitude, longitude):
+    return int((latitude + 90) // CELL_DEGREES), int((longitude + 180) // CELL_DEGREES)
+
+def geo_cell(latitude, longitude):
+    row, col = _cell_index(latitude, longitude)
+    return row * CELLS_PER_ROW + col
+
+#(south, west, north, east) of the box around a circle of radius miles
+def bounding_box(latitude, longitude, miles):
+    lat_delta = miles / MILES_PER_DEGREE
+    lon_delta = miles / (MILES_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return latitude - lat_delta, longitude - lon_delta, latitude + lat_delta, longitude + lon_delta
+
+#sql condition for posts in the grid cells and bounding box a circle of
+#radius miles touches. each grid row's cells are one range of geo_cell, so
+#the query has a bounded number of terms however wide the circle is (the
+#corners of the box still need distances_miles)
+def near(latitude, longitude, miles):
+    south, west, north, east = bounding_box(latitude, longitude, miles)
+    top, left = _cell_index(south, west)
+    bottom, right = _cell_index(north, east)
+    cells = db.or_(*(Post.geo_cell.between(row * CELLS_PER_ROW + left, row * CELLS_PER_ROW + right)
+                     for row in range(top, bottom + 1)))
+    return db.and_(cells, Post.latitude.between(south, north), Post.longitude.between(west, east))
+
+#great circle distance from one point to arrays of points, all at once
+def distances_miles(latitude, longitude, latitudes, longitudes):
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(a))
+
+def zip_location(zip_code):
+    zip_code = normalize_zip(zip_code)
+    centroid = db.session.get(ZipCentroid, zip_code) if zip_code else None
+    return (centroid.latitude, centroid.longitude) if centroid else None
+
+#{zip: (latitude, longitude)} for many zips in one query
+def zip_locations(zip_codes):
+    zip_codes = {normalize_zip(zip_code) for zip_code in zip_codes} - {None}
+    if not zip_codes:
+        return {}
+    rows = db.session.execute(db.select(ZipCentroid).where(ZipCentroid.zip.in_(zip_codes))).scalars()
+    return {row.zip: (row.latitude, row.longitude) for row in rows}
+
+#sets a post's coordinates from its zip, call before saving it
+def locate_post(post):
+    location = zip_location(post.location_zip)
+    if location:
+        post.latitude, post.longitude = location
+        post.geo_cell = geo_cell(*location)
+    else:
+        post.latitude = post.longitude = post.geo_cell = None
+
+#re-locates every post, after the zip table changes
+def locate_all_posts():
+    centroids = {row.zip: (row.latitude, row.longitude) for row in db.session.execute(db.select(ZipCentroid))
+                 .scalars()}
+    updates = []
+    for post_id, zip_code in db.session.execute(db.select(Post.id, Post.location_zip)):
+        location = centroids.get(normalize_zip(zip_code))
+        updates.append({'post_id': post_id,
+                        'latitude': location[0] if location else None,
+                        'longitude': location[1] if location else None,
+                        'geo_cell': geo_cell(*location) if location else None})
+    if updates:
+        db.session.execute(
+            db.update(Post.__table__).where(Post.__table__.c.id == db.bindparam('post_id'))
+            .values(latitude=db.bindparam('latitude'), longitude=db.bindparam('longitude'),
+                    geo_cell=db.bindparam('geo_cell')),
+            updates,
+        )
+
+def _read_centroids(path):
+    with open(path, newline='') as file:
+        first_line = file.readline()
+        file.seek(0)
+        #census gazetteer files are tab separated: GEOID ... INTPTLAT INTPTLONG
+        if '\t' in first_line:
+            reader = csv.DictReader(file, delimiter='\t')
+            for row in reader:
+                row = {key.strip(): value for key, value in row.items()}
+                yield row['GEOID'], float(row['INTPTLAT']), float(row['INTPTLONG'])
+        else:
+            for row in csv.DictReader(file):
+                yield row['zip'], float(row['latitude']), float(row['longitude'])
+
+def load_zip_centroids(path=ZIP_CENTROIDS_PATH):
+    rows = [{'zip': zip_code, 'latitude': latitude, 'longitude': longitude}
+            for zip_code, latitude, longitude in _read_centroids(path) if normalize_zip(zip_code)]
+    zips = [row['zip'] for row in rows]
+    #replace any zips that are already loaded, in chunks to stay under
+    #the database's limit on query parameters
+    for start in range(0, len(zips), 500):
+        db.session.execute(ZipCentroid.__table__.delete().where(ZipCentroid.zip.in_(zips[start:start + 500])))
+    db.session.execute(ZipCentroid.__table__.insert(), rows)
+    return len(rows)
+
+#[(post_id, miles)] for posts within miles of the point, nearest first
+def posts_within(latitude, longitude, miles):
+    rows = db.session.execute(
+        db.select(Post.id, Post.latitude, Post.longitude).where(near(latitude, longitude, miles))
+    ).all()
+    if not rows:
+        return []
+    ids, latitudes, longitudes = (np.array(column) for column in zip(*rows))
+    distances = distances_miles(latitude, longitude, latitudes, longitudes)
+    inside = distances <= miles
+    order = np.argsort(distances[inside])
+    return list(zip(ids[inside][order].tolist(), distances[inside][order].tolist()))
+
+#the count nearest posts, widening the search until enough are found
+def nearest_posts(latitude, longitude, count, max_miles=MAX_RADIUS_MILES):
+    miles = DEFAULT_RADIUS_MILES
+    while True:
+        found = posts_within(latitude, longitude, miles)
+        if len(found) >= count or miles >= max_miles:
+            return found[:count]
+        miles = min(miles * 2, max_miles)
+
+def register_commands(app):
+    @app.cli.command('load-zips')
+    @click.argument('path')
+    def load_zips(path):
+        """Load zip code centers (csv or census gazetteer) and re-locate posts."""
+        count = load_zip_centroids(path)
+        locate_all_posts()
+        db.session.commit()
+        click.echo(f'Loaded {count} zip codes.')
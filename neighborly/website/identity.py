@@ -0,0 +1,59 @@
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from . import db
+from .cache import LRUCache
+from .models import User
+
+#logged in users are looked up on every request, so recently seen users are
+#kept in memory for a short while instead of being queried each time.
+#other workers only see a change once their copy expires (USER_CACHE_TTL)
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL = 60
+
+def init_user_cache(app):
+    app.extensions['neighborly_user_cache'] = LRUCache(
+        app.config.get('USER_CACHE_SIZE', USER_CACHE_SIZE),
+        ttl=app.config.get('USER_CACHE_TTL', USER_CACHE_TTL),
+    )
+
+def _user_cache():
+    return current_app.extensions['neighborly_user_cache']
+
+def load_session_user(user_id):
+    cache = _user_cache()
+    user = cache.get(user_id)
+    if user is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        #the cached copy is detached so it outlives this request's session
+        db.session.expunge(user)
+        cache.set(user_id, user)
+    #each request gets its own copy in its session, without a query
+    return db.session.merge(user, load=False)
+
+#call after changing a user with a bulk UPDATE that skips the orm events below
+def invalidate_user(user_id):
+    _user_cache().delete(user_id)
+
+def user_cache_stats():
+    return _user_cache().stats()
+
+#profile or password changes made through the orm drop the cached copy once
+#they are committed. dropping it at flush time would let another request read
+#the old row before the commit and cache it again for the whole ttl
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, user):
+    object_session(user).info.setdefault('neighborly_changed_users', set()).add(user.id)
+
+@event.listens_for(Session, 'after_commit')
+def _drop_changed_users(session):
+    for user_id in session.info.pop('neighborly_changed_users', ()):
+        invalidate_user(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed_users(session):
+    session.info.pop('neighborly_changed_users', None)
@@ -0,0 +1,234 @@
+import csv
+import datetime
+import io
+import json
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from . import db
+from .cache import bump_board_version
+from .database import write_transaction
+from .facets import adjust_facets, post_facets
+from .events import WEEKDAYS, sync_occurrences
+from .geo import geo_cell, normalize_zip, zip_locations
+from .models import ImportJob, Post, post_tags
+from .tags import parse_tag_names, resolve_tag_ids
+
+#bulk post uploads (csv or json) run on a small thread pool so the upload
+#request returns right away. each batch of rows is validated together, its
+#tags are looked up once and it is saved in one transaction along with the
+#job's progress. settings (app.config):
+#   IMPORT_WORKERS       imports running at once per worker process
+#   IMPORT_BATCH_SIZE    rows saved per transaction
+#   MAX_IMPORT_ROWS      rows allowed in one file
+IMPORT_WORKERS = 2
+IMPORT_BATCH_SIZE = 500
+MAX_IMPORT_ROWS = 10000
+MAX_IMPORT_ERRORS = 50
+
+#columns a file can have, same names as the create form
+IMPORT_COLUMNS = ['title', 'body', 'category', 'location_city', 'location_zip', 'location_name',
+                  'event_date', 'event_day', 'event_time', 'is_recurring',
+                  'instagram_url', 'group_chat_url', 'contact_email', 'tags']
+CATEGORIES = ['event', 'club', 'announcement']
+
+#call after the database is set up
+def init_imports(app):
+    app.extensions['neighborly_imports'] = ThreadPoolExecutor(
+        app.config.get('IMPORT_WORKERS', IMPORT_WORKERS), thread_name_prefix='neighborly-import')
+    with app.app_context():
+        fail_unfinished_imports()
+
+#imports run on threads of the process that took the upload, so a job still
+#queued or running when the app starts was cut off by a restart and nothing
+#will pick it up. it's marked failed (so the page stops polling it) and its
+#upload removed
+def fail_unfinished_imports():
+    unfinished = ImportJob.status.in_(('queued', 'running'))
+    if db.session.scalar(db.select(ImportJob.id).where(unfinished).limit(1)) is None:
+        return
+
+    def fail():
+        jobs = db.session.scalars(db.select(ImportJob).where(unfinished)).all()
+        for job in jobs:
+            job.status = 'failed'
+            job.errors = json.dumps([{'row': None, 'error': 'The import was interrupted by a restart, '
+                                                            'please upload the file again.'}])
+            job.finished_at = datetime.datetime.utcnow()
+        return [job.id for job in jobs]
+
+    for job_id in write_transaction(fail):
+        path = os.path.join(_upload_dir(), f'{job_id}.upload')
+        if os.path.exists(path):
+            os.remove(path)
+
+def _upload_dir():
+    path = os.path.join(current_app.instance_path, 'imports')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+#list of row dicts from a csv file or a json list (or {"posts": [...]})
+def read_rows(filename, data):
+    text = data.decode('utf-8-sig')
+    if filename.lower().endswith('.json'):
+        rows = json.loads(text)
+        if isinstance(rows, dict):
+            rows = rows.get('posts')
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError('JSON files must hold a list of posts')
+        return rows
+    return list(csv.DictReader(io.StringIO(text)))
+
+def _text(row, name, limit=None):
+    value = row.get(name)
+    value = str(value).strip() if value is not None else ''
+    if limit and len(value) > limit:
+        raise ValueError(f'{name} is longer than {limit} characters')
+    return value or None
+
+def _parse(row, name, parse):
+    value = _text(row, name)
+    try:
+        return parse(value) if value else None
+    except ValueError:
+        raise ValueError(f'{name} "{value}" is not valid')
+
+def _is_true(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 'on')
+
+#post column values and tag names for one row, ValueError if it can't be saved
+def validate_row(row):
+    title = _text(row, 'title', 150)
+    if not title or len(title) < 2:
+        raise ValueError('title is too short')
+    category = (_text(row, 'category') or '').lower()
+    if category not in CATEGORIES:
+        raise ValueError(f'category must be one of {", ".join(CATEGORIES)}')
+    event_day = (_text(row, 'event_day') or '').lower() or None
+    if event_day and event_day not in WEEKDAYS:
+        raise ValueError(f'event_day "{event_day}" is not a day of the week')
+
+    tags = row.get('tags')
+    if isinstance(tags, list) and all(isinstance(tag, str) for tag in tags):
+        tags = ','.join(tags)
+    if tags is not None and not isinstance(tags, str):
+        raise ValueError('tags must be text or a list of text')
+    tag_names = parse_tag_names(tags)
+    return {
+        'title':          title,
+        'body':           _text(row, 'body') or '',
+        'category':       category,
+        'location_city':  _text(row, 'location_city', 100),
+        'location_zip':   _text(row, 'location_zip', 20),
+        'location_name':  _text(row, 'location_name', 150),
+        'event_date':     _parse(row, 'event_date', datetime.date.fromisoformat),
+        'event_day':      event_day,
+        'event_time':     _parse(row, 'event_time', datetime.time.fromisoformat),
+        'is_recurring':   _is_true(row.get('is_recurring')),
+        'instagram_url':  _text(row, 'instagram_url', 300),
+        'group_chat_url': _text(row, 'group_chat_url', 300),
+        'contact_email':  _text(row, 'contact_email', 150),
+    }, tag_names
+
+#saves the uploaded file and queues it, returns the job
+def queue_import(user_id, filename, data):
+    job = ImportJob(user_id=user_id, filename=filename)
+    write_transaction(lambda: db.session.add(job))
+    with open(os.path.join(_upload_dir(), f'{job.id}.upload'), 'wb') as file:
+        file.write(data)
+    app = current_app._get_current_object()
+    app.extensions['neighborly_imports'].submit(run_import, app, job.id)
+    return job
+
+def run_import(app, job_id):
+    with app.app_context():
+        path = os.path.join(_upload_dir(), f'{job_id}.upload')
+        job = db.session.get(ImportJob, job_id)
+        try:
+            with open(path, 'rb') as file:
+                rows = read_rows(job.filename or '', file.read())
+            max_rows = app.config.get('MAX_IMPORT_ROWS', MAX_IMPORT_ROWS)
+            if len(rows) > max_rows:
+                raise ValueError(f'files can have at most {max_rows} rows')
+
+            def start():
+                job.status = 'running'
+                job.total_rows = len(rows)
+            write_transaction(start)
+
+            batch_size = app.config.get('IMPORT_BATCH_SIZE', IMPORT_BATCH_SIZE)
+            errors = []
+            for offset in range(0, len(rows), batch_size):
+                errors += _import_batch(job, rows[offset:offset + batch_size], offset, errors)
+        except Exception as error:
+            db.session.rollback()
+            message = str(error)
+
+            def fail():
+                job.status = 'failed'
+                job.errors = json.dumps([{'row': None, 'error': message}])
+                job.finished_at = datetime.datetime.utcnow()
+            write_transaction(fail)
+            if not isinstance(error, (ValueError, csv.Error)):
+                app.logger.exception('import %s failed', job_id)
+        else:
+            def finish():
+                job.status = 'done'
+                job.finished_at = datetime.datetime.utcnow()
+            write_transaction(finish)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+            db.session.remove()
+
+#validates and saves one batch, returns its row errors. rows are numbered
+#from 1 like the lines of a spreadsheet (after the header)
+def _import_batch(job, rows, offset, earlier_errors):
+    posts = []
+    tags = []
+    errors = []
+    for number, row in enumerate(rows, offset + 1):
+        try:
+            values, tag_names = validate_row(row)
+        except ValueError as error:
+            errors.append({'row': number, 'error': str(error)})
+            continue
+        posts.append(values)
+        tags.append(tag_names)
+
+    locations = zip_locations(post['location_zip'] for post in posts)
+    created_at = datetime.datetime.utcnow()
+    for post in posts:
+        location = locations.get(normalize_zip(post['location_zip']))
+        post['latitude'], post['longitude'] = location or (None, None)
+        post['geo_cell'] = geo_cell(*location) if location else None
+        post['user_id'] = job.user_id
+        post['created_at'] = created_at
+
+    kept_errors = (earlier_errors + errors)[:MAX_IMPORT_ERRORS]
+
+    def save():
+        if posts:
+            tag_ids = resolve_tag_ids({name for names in tags for name in names})
+            post_ids = db.session.scalars(
+                db.insert(Post).returning(Post.id, sort_by_parameter_order=True), posts).all()
+            links = [{'post_id': post_id, 'tag_id': tag_ids[name]}
+                     for post_id, names in zip(post_ids, tags) for name in names]
+            if links:
+                db.session.execute(post_tags.insert(), links)
+            deltas = Counter()
+            for post, names in zip(posts, tags):
+                deltas.update(post_facets(post['category'], names))
+            adjust_facets(deltas)
+            sync_occurrences(post_ids)
+            bump_board_version()
+        job.processed_rows += len(rows)
+        job.imported_rows += len(posts)
+        job.failed_rows += len(errors)
+        job.errors = json.dumps(kept_errors) if kept_errors else None
+
+    write_transaction(save)
+    return errors
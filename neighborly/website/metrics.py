@@ -0,0 +1,179 @@
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import Blueprint, Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from . import db
+
+#per route request timings and sql counts, served in prometheus text format
+#at /metrics. settings (app.config):
+#   METRICS_ENABLED              set False to skip all of this
+#   N_PLUS_ONE_THRESHOLD         same statement this many times in one request
+#                                is logged as a likely n+1 query
+#   SLOW_REQUEST_MS              log requests slower than this, with their sql
+#                                (off unless set)
+N_PLUS_ONE_THRESHOLD = 5
+
+#histogram buckets, seconds for latency and statements for query counts
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+#caches whose stats() are exported alongside the request numbers
+CACHES = {'board': 'neighborly_cache', 'tags': 'neighborly_tag_cache', 'users': 'neighborly_user_cache'}
+
+metrics = Blueprint('metrics', __name__)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+class Metrics:
+    def __init__(self):
+        self.latency = {}
+        self.queries = {}
+        self.sql_seconds = Counter()
+        self.responses = Counter()
+        self.n_plus_one = Counter()
+        self.slow = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, route, method, status, seconds, statements, n_plus_one, slow):
+        key = (route, method)
+        with self._lock:
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.queries.setdefault(key, Histogram(QUERY_BUCKETS)).observe(len(statements))
+            self.sql_seconds[key] += sum(elapsed for _, elapsed in statements)
+            self.responses[key + (status,)] += 1
+            self.n_plus_one[key] += n_plus_one
+            self.slow[key] += slow
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels.items()) + '}'
+
+def _histogram_lines(name, histograms):
+    for (route, method), histogram in sorted(histograms.items()):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            yield f'{name}_bucket{_labels(route=route, method=method, le=bound)} {count}'
+        yield f'{name}_bucket{_labels(route=route, method=method, le="+Inf")} {histogram.total}'
+        yield f'{name}_sum{_labels(route=route, method=method)} {histogram.sum:g}'
+        yield f'{name}_count{_labels(route=route, method=method)} {histogram.total}'
+
+#prometheus text format
+def render_metrics(app):
+    stats = app.extensions['neighborly_metrics']
+    with stats._lock:
+        lines = ['# TYPE neighborly_request_seconds histogram']
+        lines += _histogram_lines('neighborly_request_seconds', stats.latency)
+        lines.append('# TYPE neighborly_request_queries histogram')
+        lines += _histogram_lines('neighborly_request_queries', stats.queries)
+        lines.append('# TYPE neighborly_request_sql_seconds_total counter')
+        lines += [f'neighborly_request_sql_seconds_total{_labels(route=route, method=method)} {value:.6f}'
+                  for (route, method), value in sorted(stats.sql_seconds.items())]
+        lines.append('# TYPE neighborly_responses_total counter')
+        lines += [f'neighborly_responses_total{_labels(route=route, method=method, status=status)} {value}'
+                  for (route, method, status), value in sorted(stats.responses.items())]
+        lines.append('# TYPE neighborly_n_plus_one_total counter')
+        lines += [f'neighborly_n_plus_one_total{_labels(route=route, method=method)} {value}'
+                  for (route, method), value in sorted(stats.n_plus_one.items())]
+        lines.append('# TYPE neighborly_slow_requests_total counter')
+        lines += [f'neighborly_slow_requests_total{_labels(route=route, method=method)} {value}'
+                  for (route, method), value in sorted(stats.slow.items())]
+
+    for cache_name, extension in CACHES.items():
+        cache = app.extensions.get(extension)
+        if not hasattr(cache, 'stats'):
+            continue
+        for stat, value in cache.stats().items():
+            lines.append(f'neighborly_cache_{stat}{_labels(cache=cache_name)} {value}')
+    return '\n'.join(lines) + '\n'
+
+@metrics.route('/metrics', methods=['GET'])
+def show_metrics():
+    return Response(render_metrics(current_app), mimetype='text/plain; version=0.0.4')
+
+#same statement with different values, so "id IN (?, ?, ?)" and
+#"id IN (?)" count as one when looking for n+1 patterns
+def normalize_statement(statement):
+    statement = re.sub(r'\(\s*\?(\s*,\s*\?)*\s*\)', '(?)', statement)
+    return ' '.join(statement.split())
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info.setdefault('neighborly_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('neighborly_query_start')
+    if not has_request_context() or not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    statements = g.get('metrics_statements')
+    if statements is not None:
+        statements.append((statement, elapsed))
+
+def _start_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_statements = []
+
+def _finish_request(status):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    seconds = time.perf_counter() - start
+    statements = g.pop('metrics_statements', [])
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    app = current_app._get_current_object()
+
+    repeated = [(statement, count) for statement, count in
+                Counter(normalize_statement(statement) for statement, _ in statements).items()
+                if count >= app.config.get('N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD)]
+    for statement, count in repeated:
+        app.logger.warning('possible n+1 on %s %s: %d x %s', request.method, route, count, statement)
+
+    slow_ms = app.config.get('SLOW_REQUEST_MS')
+    slow = slow_ms is not None and seconds * 1000 >= slow_ms
+    if slow:
+        app.logger.warning('slow request %s %s: %.1f ms, %d statements%s', request.method, request.full_path,
+                           seconds * 1000, len(statements),
+                           ''.join(f'\n  {elapsed * 1000:7.2f} ms  {" ".join(statement.split())}'
+                                   for statement, elapsed in statements))
+
+    app.extensions['neighborly_metrics'].record(route, request.method, status, seconds, statements,
+                                                len(repeated), int(slow))
+
+def init_metrics(app):
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    app.extensions['neighborly_metrics'] = Metrics()
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_request():
+        _start_request()
+
+    @app.after_request
+    def finish_request(response):
+        _finish_request(response.status_code)
+        return response
+
+    #requests that raised never reach after_request
+    @app.teardown_request
+    def finish_failed_request(error):
+        _finish_request(500)
+
+    app.register_blueprint(metrics)
@@ -1,4 +1,5 @@
 import datetime
+import json
 
 from . import db
 from flask_login import UserMixin
@@ -16,6 +17,10 @@ class Post(db.Model):
     location_city = db.Column(db.String(100))
     location_zip = db.Column(db.String(20))
     location_name = db.Column(db.String(150))
+    #filled in from location_zip when the post is saved (see geo.py)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geo_cell = db.Column(db.Integer)
 
     #days
     event_date = db.Column(db.Date) #single day/start day
@@ -37,25 +42,44 @@ class Post(db.Model):
     author = db.relationship('User', backref='posts')
     tags = db.relationship('Tag', secondary='post_tags', backref='posts')
 
+    #board is read newest first and paged by (created_at, id), each filter
+    #gets an index that also covers that order
+    __table_args__ = (
+        db.Index('ix_post_created_at_id', created_at, id),
+        db.Index('ix_post_category_created_at', category, created_at, id),
+        db.Index('ix_post_city_created_at', func.lower(location_city), created_at, id),
+        db.Index('ix_post_zip_created_at', location_zip, created_at, id),
+        db.Index('ix_post_day_created_at', event_day, created_at, id),
+        db.Index('ix_post_event_date', event_date),
+        db.Index('ix_post_geo_cell', geo_cell),
+    )
+
     def to_dict(self):
-        return {
-            'id':           self.id,
-            'title':        self.title,
-            'body':         self.body,
-            'category':     self.category,
-            'location_city': self.location_city,
-            'location_zip':  self.location_zip,
-            'location_name': self.location_name,
-            'event_date':   self.event_date.isoformat() if self.event_date else None,
-            'event_day':    self.event_day,
-            'event_time':   str(self.event_time) if self.event_time else None,
-            'is_recurring': self.is_recurring,
-            'instagram_url': self.instagram_url,
-            'group_chat_url': self.group_chat_url,
-            'tags':         [t.name for t in self.tags],
-            'author':       self.author.username or self.author.first_name,
-            'created_at':   self.created_at.isoformat(),
-        }
+        return serialize_post(self, [t.name for t in self.tags],
+                              self.author.username or self.author.first_name)
+
+
+#shared by Post.to_dict and the posts api, which passes plain result rows
+#(anything with the post's column names) instead of loading full objects
+def serialize_post(post, tags, author):
+    return {
+        'id':           post.id,
+        'title':        post.title,
+        'body':         post.body,
+        'category':     post.category,
+        'location_city': post.location_city,
+        'location_zip':  post.location_zip,
+        'location_name': post.location_name,
+        'event_date':   post.event_date.isoformat() if post.event_date else None,
+        'event_day':    post.event_day,
+        'event_time':   str(post.event_time) if post.event_time else None,
+        'is_recurring': post.is_recurring,
+        'instagram_url': post.instagram_url,
+        'group_chat_url': post.group_chat_url,
+        'tags':         tags,
+        'author':       author,
+        'created_at':   post.created_at.isoformat(),
+    }
 
 
 class User(db.Model, UserMixin):
@@ -83,5 +107,86 @@ class Tag(db.Model):
 
 post_tags = db.Table('post_tags',
     db.Column('post_id', db.Integer, db.ForeignKey('post.id')),
-    db.Column('tag_id',  db.Integer, db.ForeignKey('tag.id'))
-)
\ No newline at end of file
+    db.Column('tag_id',  db.Integer, db.ForeignKey('tag.id')),
+    #tag filter looks up posts by tag, loading a post's tags goes the other way
+    db.Index('ix_post_tags_tag_post', 'tag_id', 'post_id'),
+    db.Index('ix_post_tags_post_tag', 'post_id', 'tag_id'),
+)
+
+
+#zip code centers, loaded once from website/data (see geo.py)
+class ZipCentroid(db.Model):
+    zip = db.Column(db.String(5), primary_key=True)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+
+
+#one row per day a post's event happens, recurring posts are expanded a
+#few months ahead (see events.py) so date range questions are one index scan
+class EventOccurrence(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    occurs_on = db.Column(db.Date, nullable=False)
+    starts_at = db.Column(db.Time)
+
+    __table_args__ = (
+        db.Index('ix_event_occurrence_date', occurs_on, starts_at),
+        db.UniqueConstraint(post_id, occurs_on, name='uq_event_occurrence_post_date'),
+    )
+
+
+#a file of posts uploaded at /import, processed in the background (see
+#imports.py). clients poll /api/imports/<id> for the counts and status
+class ImportJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(255))
+    status = db.Column(db.String(20), nullable=False, default='queued') #queued, running, done, failed
+    total_rows = db.Column(db.Integer, nullable=False, default=0)
+    processed_rows = db.Column(db.Integer, nullable=False, default=0)
+    imported_rows = db.Column(db.Integer, nullable=False, default=0)
+    failed_rows = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Text) #json list of {row, error}, first MAX_IMPORT_ERRORS only
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_import_job_user', user_id, created_at),
+    )
+
+    def to_dict(self):
+        return {
+            'id':             self.id,
+            'filename':       self.filename,
+            'status':         self.status,
+            'total_rows':     self.total_rows,
+            'processed_rows': self.processed_rows,
+            'imported_rows':  self.imported_rows,
+            'failed_rows':    self.failed_rows,
+            'errors':         json.loads(self.errors) if self.errors else [],
+            'created_at':     self.created_at.isoformat() if self.created_at else None,
+            'finished_at':    self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+#how many posts have each tag and category, for the filter bar. rebuilt by
+#facets.rebuild_facets and adjusted by every post write (see facets.py)
+class FacetCount(db.Model):
+    kind = db.Column(db.String(20), primary_key=True) #tag or category
+    value = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+#single row that changes whenever a post is created, edited or deleted
+#(cached board pages are keyed on version)
+class BoardState(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+
+#key/value settings for the app itself, e.g. which schema version and
+#default data the database has been brought up to
+class AppMeta(db.Model):
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(100))
@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+#password hashing is slow on purpose, so it runs in a small process pool
+#instead of on the request worker. settings (app.config):
+#   PASSWORD_HASH_METHOD         werkzeug method, e.g. 'pbkdf2:sha256:600000'
+#   PASSWORD_HASH_WORKERS        pool size, 0 hashes inline (cpu count by default)
+#   PASSWORD_HASH_MAX_PENDING    hashes allowed in flight or waiting at once
+#   PASSWORD_HASH_QUEUE_TIMEOUT  seconds to wait for a slot before giving up
+PASSWORD_HASH_METHOD = 'pbkdf2:sha256'
+PASSWORD_HASH_QUEUE_TIMEOUT = 5
+#n:r:p werkzeug uses for a plain 'scrypt'
+SCRYPT_DEFAULTS = '32768:8:1'
+
+class HashingBusy(Exception):
+    pass
+
+#fills in werkzeug's defaults so the method can be compared with the prefix
+#of a stored hash ('pbkdf2:sha256:1000000$salt$hash', 'scrypt:32768:8:1$...')
+def normalize_method(method):
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2':
+        hash_name = parts[1] if len(parts) > 1 else 'sha256'
+        iterations = parts[2] if len(parts) > 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    if parts[0] == 'scrypt' and len(parts) == 1:
+        return f'scrypt:{SCRYPT_DEFAULTS}'
+    return method
+
+class PasswordHasher:
+    def __init__(self, method=PASSWORD_HASH_METHOD, workers=None, max_pending=None,
+                 queue_timeout=PASSWORD_HASH_QUEUE_TIMEOUT):
+        self.method = method
+        #what a hash made with method starts with
+        self.prefix = normalize_method(method)
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_pending or max(self.workers, 1) * 4)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                #spawn so workers don't inherit the app's threads and db connections.
+                #the jobs are werkzeug's own functions so a worker only imports
+                #werkzeug, keep it that way (and keep main.py's app behind its
+                #__main__ check, spawned workers import it again)
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise HashingBusy()
+        try:
+            if not self.workers:
+                return fn(*args)
+            return self._executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        stored = self._run(generate_password_hash, password, self.method)
+        #in case werkzeug filled in defaults normalize_method doesn't know
+        #about, compare with what it actually wrote from now on
+        self.prefix = stored.split('$', 1)[0]
+        return stored
+
+    def verify(self, stored, password):
+        return self._run(check_password_hash, stored, password)
+
+    #true when a stored hash was made with different settings than now
+    def needs_rehash(self, stored):
+        return stored.split('$', 1)[0] != self.prefix
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+def init_password_hasher(app):
+    app.extensions['neighborly_hasher'] = PasswordHasher(
+        method=app.config.get('PASSWORD_HASH_METHOD', PASSWORD_HASH_METHOD),
+        workers=app.config.get('PASSWORD_HASH_WORKERS'),
+        max_pending=app.config.get('PASSWORD_HASH_MAX_PENDING'),
+        queue_timeout=app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT', PASSWORD_HASH_QUEUE_TIMEOUT),
+    )
+
+def get_hasher():
+    return current_app.extensions['neighborly_hasher']
@@ -0,0 +1,86 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateIndex
+
+from . import db
+from .database import write_transaction
+from .models import AppMeta, BoardState, Tag
+from .tags import insert_ignore
+
+#bump SCHEMA_VERSION when tables/indexes/triggers change and SEED_VERSION
+#when DEFAULT_TAGS or the bundled zip codes change, the next boot brings the database up to date
+SCHEMA_VERSION = 5
+SEED_VERSION = 2
+
+DEFAULT_TAGS = ['free', 'outdoor', 'indoor', 'family-friendly',
+                '18+', 'sports', 'music', 'food', 'fitness',
+                'arts', 'volunteering', 'weekly', 'one-time']
+
+def stored_versions():
+    #own connection so a missing table on a brand new database doesn't
+    #break the session's transaction
+    try:
+        with db.engine.connect() as conn:
+            rows = conn.execute(db.select(AppMeta.key, AppMeta.value)).all()
+    except (OperationalError, ProgrammingError):
+        return {}
+    return {key: int(value) for key, value in rows if key in ('schema_version', 'seed_version')}
+
+def _set_version(key, value):
+    db.session.execute(AppMeta.__table__.delete().where(AppMeta.key == key))
+    db.session.add(AppMeta(key=key, value=str(value)))
+
+def _add_column(conn, table, column):
+    quote = conn.dialect.identifier_preparer.quote
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f'ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}'))
+
+def upgrade_schema():
+    db.create_all()
+    #create_all skips tables that already exist, so add new columns and
+    #indexes to them (new columns on old tables have to be nullable)
+    with db.engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    _add_column(conn, table, column)
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+    from .search import init_search
+    init_search()
+
+    from .events import rebuild_occurrences
+    from .facets import rebuild_facets
+
+    def fill_tables():
+        db.session.execute(insert_ignore(BoardState.__table__), [{'id': 1, 'version': 0}])
+        if db.session.get(AppMeta, 'occurrences_through') is None:
+            rebuild_occurrences()
+        #cheap enough to recount on every upgrade, which also fixes any drift
+        rebuild_facets()
+        _set_version('schema_version', SCHEMA_VERSION)
+
+    write_transaction(fill_tables)
+
+def seed_defaults():
+    db.session.execute(insert_ignore(Tag.__table__), [{'name': name} for name in DEFAULT_TAGS])
+
+    from .geo import load_zip_centroids, locate_all_posts
+    load_zip_centroids()
+    locate_all_posts()
+    _set_version('seed_version', SEED_VERSION)
+    db.session.commit()
+
+#a normal boot is one small query, the upgrade steps only run the first time
+#a database sees a new version (they are safe to run twice, so workers
+#booting at the same time don't conflict)
+def ensure_database():
+    versions = stored_versions()
+    if versions.get('schema_version') != SCHEMA_VERSION:
+        upgrade_schema()
+        print(f'Database schema at version {SCHEMA_VERSION}')
+    if versions.get('seed_version') != SEED_VERSION:
+        seed_defaults()
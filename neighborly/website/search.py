@@ -0,0 +1,108 @@
+import re
+
+from sqlalchemy import or_, text
+from sqlalchemy.orm import joinedload, selectinload
+
+from . import db
+from .models import Post
+
+PAGE_SIZE = 24
+
+#bm25 column weights: title, body, location_name, tags
+RANK = 'bm25(post_fts, 10.0, 1.0, 2.0, 5.0)'
+
+#post_fts keeps its own copy of the searchable text, triggers keep it in step
+#with post and post_tags so create/edit/delete never rebuild the whole index
+SEARCH_SCHEMA = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(
+        title, body, location_name, tags,
+        tokenize = 'porter unicode61', prefix = '2 3'
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS post_fts_insert AFTER INSERT ON post BEGIN
+        INSERT INTO post_fts (rowid, title, body, location_name, tags)
+        VALUES (new.id, new.title, new.body, new.location_name, '');
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS post_fts_update AFTER UPDATE OF title, body, location_name ON post BEGIN
+        UPDATE post_fts SET title = new.title, body = new.body, location_name = new.location_name
+        WHERE rowid = new.id;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS post_fts_delete AFTER DELETE ON post BEGIN
+        DELETE FROM post_fts WHERE rowid = old.id;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS post_fts_tag_insert AFTER INSERT ON post_tags BEGIN
+        UPDATE post_fts SET tags = (
+            SELECT group_concat(tag.name, ' ') FROM post_tags
+            JOIN tag ON tag.id = post_tags.tag_id WHERE post_tags.post_id = new.post_id
+        ) WHERE rowid = new.post_id;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS post_fts_tag_delete AFTER DELETE ON post_tags BEGIN
+        UPDATE post_fts SET tags = coalesce((
+            SELECT group_concat(tag.name, ' ') FROM post_tags
+            JOIN tag ON tag.id = post_tags.tag_id WHERE post_tags.post_id = old.post_id
+        ), '') WHERE rowid = old.post_id;
+    END''',
+]
+
+def fts_enabled():
+    return db.engine.dialect.name == 'sqlite'
+
+def init_search():
+    if not fts_enabled():
+        return
+    with db.engine.begin() as conn:
+        for statement in SEARCH_SCHEMA:
+            conn.execute(text(statement))
+        #first boot on an existing board - index the posts that are already there
+        indexed = conn.execute(text('SELECT count(*) FROM post_fts')).scalar()
+        if not indexed and conn.execute(text('SELECT 1 FROM post LIMIT 1')).first():
+            rebuild_search_index(conn)
+
+def rebuild_search_index(conn):
+    conn.execute(text('DELETE FROM post_fts'))
+    conn.execute(text('''
+        INSERT INTO post_fts (rowid, title, body, location_name, tags)
+        SELECT post.id, post.title, post.body, post.location_name,
+               coalesce((SELECT group_concat(tag.name, ' ') FROM post_tags
+                         JOIN tag ON tag.id = post_tags.tag_id
+                         WHERE post_tags.post_id = post.id), '')
+        FROM post
+    '''))
+
+#turns what the user typed into an fts5 query: every word must match and the
+#last one is treated as a prefix so partial words still find results
+def to_match_query(q):
+    words = re.findall(r'\w+', q.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+def search_posts(q, page=1, per_page=PAGE_SIZE):
+    match = to_match_query(q or '')
+    if not match:
+        return [], False
+
+    offset = (page - 1) * per_page
+    if fts_enabled():
+        rows = db.session.execute(text(f'''
+            SELECT rowid FROM post_fts WHERE post_fts MATCH :match
+            ORDER BY {RANK} LIMIT :limit OFFSET :offset
+        '''), {'match': match, 'limit': per_page + 1, 'offset': offset})
+        ids = [row[0] for row in rows]
+    else:
+        #other databases have no fts5, fall back to a plain scan
+        words = re.findall(r'\w+', q.lower())
+        query = db.session.query(Post.id)
+        for word in words:
+            query = query.filter(or_(Post.title.ilike(f'%{word}%'), Post.body.ilike(f'%{word}%')))
+        ids = [row[0] for row in query.order_by(Post.created_at.desc())
+               .limit(per_page + 1).offset(offset)]
+
+    has_more = len(ids) > per_page
+    ids = ids[:per_page]
+    posts = (Post.query.options(joinedload(Post.author), selectinload(Post.tags))
+             .filter(Post.id.in_(ids)).all())
+    #keep the rank order from the search
+    by_id = {post.id: post for post in posts}
+    return [by_id[post_id] for post_id in ids if post_id in by_id], has_more
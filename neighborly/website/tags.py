@@ -0,0 +1,93 @@
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import db
+from .cache import LRUCache
+from .models import Tag, post_tags
+
+TAG_CACHE_SIZE = 1024
+
+def init_tag_cache(app):
+    #tag names never change id, so name -> id lookups can be kept in memory
+    app.extensions['neighborly_tag_cache'] = LRUCache(app.config.get('TAG_CACHE_SIZE', TAG_CACHE_SIZE))
+
+def _tag_cache():
+    return current_app.extensions['neighborly_tag_cache']
+
+#INSERT that skips rows hitting a unique constraint instead of failing
+def insert_ignore(table):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    return db.insert(table)
+
+#splits the comma separated tags field into clean, unique names (keeps order)
+def parse_tag_names(raw):
+    names = []
+    for name in (raw or '').split(','):
+        name = name.strip().lower()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+#returns {name: id} for every name, creating missing tags, in at most
+#three queries no matter how many tags there are
+def resolve_tag_ids(names):
+    cache = _tag_cache()
+    ids = {}
+    missing = []
+    for name in names:
+        tag_id = cache.get(name)
+        if tag_id is None:
+            missing.append(name)
+        else:
+            ids[name] = tag_id
+    if not missing:
+        return ids
+
+    found = dict(db.session.execute(db.select(Tag.name, Tag.id).where(Tag.name.in_(missing))).all())
+    for name, tag_id in found.items():
+        cache.set(name, tag_id)
+
+    new = [name for name in missing if name not in found]
+    if new:
+        db.session.execute(insert_ignore(Tag.__table__), [{'name': name} for name in new])
+        #new ids aren't cached until a later lookup finds them committed,
+        #so a rolled back post can't leave bad ids in the cache
+        found.update(db.session.execute(db.select(Tag.name, Tag.id).where(Tag.name.in_(new))).all())
+
+    ids.update(found)
+    return ids
+
+#makes post_tags for a post match names by only adding and removing the
+#difference, returns the (added, removed) tag ids
+def set_post_tags(post_id, names, new_post=False):
+    wanted = set(resolve_tag_ids(names).values())
+    if new_post:
+        current = set()
+    else:
+        current = set(db.session.scalars(db.select(post_tags.c.tag_id).where(post_tags.c.post_id == post_id)))
+
+    added = wanted - current
+    removed = current - wanted
+    if removed:
+        db.session.execute(post_tags.delete().where(
+            post_tags.c.post_id == post_id, post_tags.c.tag_id.in_(removed)))
+    if added:
+        db.session.execute(post_tags.insert(), [{'post_id': post_id, 'tag_id': tag_id} for tag_id in added])
+    return added, removed
+
+#{post_id: [tag names]} for a batch of posts in one query
+def tag_names_for_posts(post_ids):
+    names = {post_id: [] for post_id in post_ids}
+    rows = db.session.execute(
+        db.select(post_tags.c.post_id, Tag.name)
+        .join(Tag, Tag.id == post_tags.c.tag_id)
+        .where(post_tags.c.post_id.in_(post_ids))
+        .order_by(Tag.name)
+    )
+    for post_id, name in rows:
+        names[post_id].append(name)
+    return names
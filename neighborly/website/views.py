@@ -1,18 +1,173 @@
-from flask import Blueprint, render_template, request, flash, jsonify, redirect, url_for
+from flask import Blueprint, render_template, request, flash, jsonify, redirect, url_for, make_response, session
 from flask_login import login_required, current_user
-from .models import Post, Tag
+from markupsafe import Markup
+from .models import ImportJob, Post
+from .feed import get_feed_page, parse_filters
+from .search import search_posts
+from .cache import cached, get_board_state, bump_board_version
+from .tags import parse_tag_names, set_post_tags
+from .geo import locate_post
+from .database import write_transaction
+from .facets import adjust_facets, facet_counts, post_facets, remove_post_facets, tag_facet_changes
+from .imports import IMPORT_COLUMNS, queue_import
+from .events import delete_occurrences, occurrences_between, sync_occurrences, this_weekend
 from . import db
+import datetime
+import hashlib
 import json
 
 #creates a new page
 views = Blueprint('views', __name__)
 
+MAX_IMPORT_BYTES = 5 * 1024 * 1024
+
+#board pages only change when a post is written, so they are cached and
+#validated against the board version instead of being rebuilt every hit
+def _board_etag(*parts):
+    raw = '|'.join(str(part) for part in parts)
+    return hashlib.md5(raw.encode()).hexdigest()
+
+def _last_modified(updated_at):
+    return updated_at.replace(microsecond=0, tzinfo=datetime.timezone.utc)
+
+def _not_modified(etag, last_modified):
+    #If-None-Match wins over If-Modified-Since when a browser sends both
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    return since is not None and since >= last_modified
+
+def _conditional(response, etag, last_modified):
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    #browsers may keep the page but have to check the etag before using it
+    response.cache_control.no_cache = True
+    return response
+
+#rendered post cards for one page of the board, shared by every viewer
+def _feed_fragment(version, cursor, filters):
+    def build():
+        posts, next_cursor = get_feed_page(cursor, filters=filters)
+        html = Markup(render_template("post_cards.html", posts=posts)) if posts else Markup('')
+        return html, next_cursor
+    return cached(('feed', version, cursor, tuple(sorted(filters.items()))), build)
+
 #now only looking at the board (creating a post should be separate)
 @views.route('/', methods=['GET'])
 def home():
-    posts = Post.query.order_by(Post.created_at.desc()).all()
-    tags = Tag.query.order_by(Tag.name).all()
-    return render_template("home.html", user=current_user, posts=posts, tags=tags)
+    filters = parse_filters(request.args)
+    version, updated_at = get_board_state()
+    last_modified = _last_modified(updated_at)
+    #flashed messages are shown once, so those pages can't be reused
+    reusable = not session.get('_flashes')
+    etag = _board_etag('home', version, current_user.get_id(), request.query_string)
+    if reusable and _not_modified(etag, last_modified):
+        return _conditional(make_response('', 304), etag, last_modified)
+
+    def render():
+        cards_html, next_cursor = _feed_fragment(version, None, filters)
+        facets = cached(('facets', version), facet_counts)
+        tag_chips = cached(('tag_chips', version, filters.get('tag')), lambda: Markup(render_template(
+            "tag_chips.html", tags=facets['tag'], filters=filters)))
+        return render_template("home.html", user=current_user, cards_html=cards_html, tag_chips=tag_chips,
+                               category_counts=facets['category'], next_cursor=next_cursor, filters=filters)
+
+    #the whole page is only shared between anonymous visitors, logged in
+    #users get their own navbar around the cached fragments
+    if reusable and not current_user.is_authenticated:
+        html = cached(('home', version, request.query_string), render)
+    else:
+        html = render()
+
+    response = make_response(html)
+    if reusable:
+        _conditional(response, etag, last_modified)
+    return response
+
+#filtered and/or next page of the board for the filter bar and load more
+@views.route('/feed', methods=['GET'])
+def feed():
+    filters = parse_filters(request.args)
+    version, updated_at = get_board_state()
+    last_modified = _last_modified(updated_at)
+    etag = _board_etag('feed', version, request.query_string)
+    if _not_modified(etag, last_modified):
+        return _conditional(make_response('', 304), etag, last_modified)
+
+    html, next_cursor = _feed_fragment(version, request.args.get('cursor'), filters)
+    return _conditional(jsonify({'html': html, 'next_cursor': next_cursor}), etag, last_modified)
+
+#keyword search over titles, descriptions, venues and tags
+@views.route('/search', methods=['GET'])
+def search():
+    q = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    page = max(page, 1)
+    posts, has_more = search_posts(q, page)
+    return render_template("search.html", user=current_user, q=q, posts=posts, page=page, has_more=has_more)
+
+#date and time inputs send '' when left empty
+def _form_date(name):
+    value = request.form.get(name)
+    try:
+        return datetime.date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+def _form_time(name):
+    value = request.form.get(name)
+    try:
+        return datetime.time.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+#upcoming events by day, ?when=weekend or ?start=&end= (YYYY-MM-DD)
+@views.route('/events', methods=['GET'])
+def events():
+    today = datetime.date.today()
+    if request.args.get('when') == 'weekend':
+        start, end = this_weekend(today)
+    else:
+        start = _arg_date('start') or today
+        end = _arg_date('end') or start + datetime.timedelta(days=13)
+    days = {}
+    for occurrence in occurrences_between(start, end):
+        days.setdefault(occurrence.occurs_on, []).append(occurrence)
+    return render_template("events.html", user=current_user, days=days, start=start, end=end,
+                           when=request.args.get('when'))
+
+#bulk upload of posts from a csv or json file, processed in the background
+#(see imports.py), the page polls /api/imports/<id> for progress
+@views.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_posts():
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        filename = upload.filename if upload else ''
+        data = upload.read(MAX_IMPORT_BYTES + 1) if upload else b''
+        if not filename.lower().endswith(('.csv', '.json')):
+            flash('Choose a .csv or .json file.', category='error')
+        elif not data:
+            flash('That file is empty.', category='error')
+        elif len(data) > MAX_IMPORT_BYTES:
+            flash('That file is too big.', category='error')
+        else:
+            job = queue_import(current_user.id, filename, data)
+            flash('Import started!', category='success')
+            return redirect(url_for('views.import_posts', job=job.id))
+
+    jobs = db.session.scalars(
+        db.select(ImportJob).where(ImportJob.user_id == current_user.id)
+        .order_by(ImportJob.created_at.desc()).limit(10)
+    ).all()
+    return render_template("import.html", user=current_user, jobs=jobs, columns=IMPORT_COLUMNS,
+                           current_job=request.args.get('job', type=int))
+
+def _arg_date(name):
+    try:
+        return datetime.date.fromisoformat(request.args.get(name, ''))
+    except ValueError:
+        return None
 
 #create new post
 @views.route('/create', methods=['GET', 'POST'])
@@ -25,44 +180,46 @@ def create_post():
         location_city = request.form.get('location_city')
         location_zip = request.form.get('location_zip')
         location_name = request.form.get('location_name')
-        event_date = request.form.get('event_date') or None
+        event_date = _form_date('event_date')
         event_day = request.form.get('event_day')
-        event_time = request.form.get('event_time') or None
+        event_time = _form_time('event_time')
         is_recurring = request.form.get('is_recurring') == 'on'
         instagram_url = request.form.get('instagram_url')
         group_chat_url = request.form.get('group_chat_url')
         contact_email = request.form.get('contact_email')
-        tag_names = request.form.get('tags', '').split(',')
+        tag_names = parse_tag_names(request.form.get('tags'))
         if len(title) < 2:
             flash('Title is too short.', category='error')
         else:
-            new_post = Post(title=title, 
-                            body=body, 
-                            category=category,
-                            location_city=location_city, 
-                            location_zip=location_zip,
-                            location_name=location_name, 
-                            event_date=event_date,
-                            event_day=event_day, 
-                            event_time=event_time,
-                            is_recurring=is_recurring, 
-                            instagram_url=instagram_url,
-                            group_chat_url=group_chat_url, 
-                            contact_email=contact_email,
-                            user_id=current_user.id)
-        #look up tags to see if included
-        for name in tag_names:
-            name = name.strip().lower()
-            if name:
-                tag = Tag.query.filter_by(name=name).first()
-                if not tag:
-                    tag = Tag(name=name)
-                    db.session.add(tag)
-                new_post.tags.append(tag)
-        db.session.add(new_post)
-        db.session.commit()
-        flash('Post created!', category='success')
-        return redirect(url_for('views.home'))
+            user_id = current_user.id
+
+            def save():
+                new_post = Post(title=title, 
+                                body=body, 
+                                category=category,
+                                location_city=location_city, 
+                                location_zip=location_zip,
+                                location_name=location_name, 
+                                event_date=event_date,
+                                event_day=event_day, 
+                                event_time=event_time,
+                                is_recurring=is_recurring, 
+                                instagram_url=instagram_url,
+                                group_chat_url=group_chat_url, 
+                                contact_email=contact_email,
+                                user_id=user_id)
+                locate_post(new_post)
+                db.session.add(new_post)
+                #flush to get the post id, then link all tags in one insert
+                db.session.flush()
+                set_post_tags(new_post.id, tag_names, new_post=True)
+                adjust_facets(post_facets(category, tag_names))
+                sync_occurrences([new_post.id])
+                bump_board_version()
+
+            write_transaction(save)
+            flash('Post created!', category='success')
+            return redirect(url_for('views.home'))
 
     return render_template('create.html', user=current_user)
 
@@ -71,10 +228,17 @@ def create_post():
 def delete_post():
     data = json.loads(request.data)
     postId = data['postId']
-    post = Post.query.get(postId)
-    if post and post.user_id == current_user.id:
-        db.session.delete(post)
-        db.session.commit()
+    user_id = current_user.id
+
+    def delete():
+        post = db.session.get(Post, postId)
+        if post and post.user_id == user_id:
+            remove_post_facets(post)
+            delete_occurrences([post.id])
+            db.session.delete(post)
+            bump_board_version()
+
+    write_transaction(delete)
     #turn empty python into json object to return 
     return jsonify({})
 
@@ -90,30 +254,32 @@ def edit_post(id):
 
     #submitted form to edit post
     if request.method == 'POST':
-        post.title = request.form.get('title')
-        post.body = request.form.get('body')
-        post.category = request.form.get('category')
-        post.location_city = request.form.get('location_city')
-        post.location_zip = request.form.get('location_zip')
-        post.location_name = request.form.get('location_name')
-        post.event_date = request.form.get('event_date') or None
-        post.event_day = request.form.get('event_day')
-        post.event_time = request.form.get('event_time') or None
-        post.is_recurring = request.form.get('is_recurring') == 'on'
-        post.instagram_url = request.form.get('instagram_url')
-        post.group_chat_url = request.form.get('group_chat_url')
-        post.contact_email = request.form.get('contact_email')
-        tag_names = request.form.get('tags', '').split(',')
-        post.tags = []
-        for name in tag_names:
-            name = name.strip().lower()
-            if name:
-                tag = Tag.query.filter_by(name=name).first()
-                if not tag:
-                    tag = Tag(name=name)
-                    db.session.add(tag)
-                post.tags.append(tag)
-        db.session.commit()
+        def save():
+            old_category = post.category
+            post.title = request.form.get('title')
+            post.body = request.form.get('body')
+            post.category = request.form.get('category')
+            post.location_city = request.form.get('location_city')
+            post.location_zip = request.form.get('location_zip')
+            post.location_name = request.form.get('location_name')
+            locate_post(post)
+            post.event_date = _form_date('event_date')
+            post.event_day = request.form.get('event_day')
+            post.event_time = _form_time('event_time')
+            post.is_recurring = request.form.get('is_recurring') == 'on'
+            post.instagram_url = request.form.get('instagram_url')
+            post.group_chat_url = request.form.get('group_chat_url')
+            post.contact_email = request.form.get('contact_email')
+            #only the tags that were added or removed touch post_tags
+            added, removed = set_post_tags(post.id, parse_tag_names(request.form.get('tags')))
+            changes = tag_facet_changes(added, removed)
+            if post.category != old_category:
+                changes.update({('category', old_category): -1, ('category', post.category): 1})
+            adjust_facets(changes)
+            sync_occurrences([post.id])
+            bump_board_version()
+
+        write_transaction(save)
         flash("Post updated!", category='success')
         return redirect(url_for('views.home'))
     
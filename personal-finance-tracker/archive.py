@@ -0,0 +1,40 @@
+import os
+
+#pyarrow is optional, without it every month stays in sqlite only
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+#closed months can be copied out of sqlite into one arrow ipc file per
+#month. the files are memory mapped when read, so loading years of history
+#skips sqlite's row by row decoding and the pages are shared with the os
+#cache instead of copied. sqlite stays the source of truth: the archive is
+#only read for months its manifest says are unchanged (see database.py)
+
+COLUMNS = ["id", "date", "details", "amount_cents", "debit_or_credit", "category"]
+
+def available():
+    return pa is not None
+
+def month_path(directory, month):
+    return os.path.join(directory, f"{month}.arrow")
+
+#writes a month's transactions (a dataframe with COLUMNS) to its file
+def write_month(directory, month, df):
+    os.makedirs(directory, exist_ok=True)
+    path = month_path(directory, month)
+    table = pa.Table.from_pandas(df[COLUMNS], preserve_index=False)
+    #written next to the old file and swapped in, readers never see half a file
+    with pa.OSFile(path + ".tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + ".tmp", path)
+
+#the archived months as one dataframe with COLUMNS
+def read_months(directory, months):
+    tables = []
+    for month in months:
+        with pa.memory_map(month_path(directory, month)) as source:
+            tables.append(pa.ipc.open_file(source).read_all())
+    return pa.concat_tables(tables).to_pandas()
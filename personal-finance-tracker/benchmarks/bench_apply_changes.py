@@ -0,0 +1,66 @@
+#the Apply Changes click on a large expense table: the old row-by-row loop vs
+#the merge on id with batched writes (database.apply_category_edits), on
+#throwaway databases. run from the personal-finance-tracker folder:
+#   python benchmarks/bench_apply_changes.py --rows 50000 --edits 200
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from bench_ingest import make_statement
+
+CATEGORIES = ["Groceries", "Shopping", "Travel", "Entertainment", "Insurance"]
+
+#what main.py did before: a filter of debits per edited row, then an UPDATE
+#and add_keyword for every change
+def apply_loop(edited_df, debits):
+    with database.unit_of_work() as conn:
+        for idx, row in edited_df.iterrows():
+            original_row = debits[debits["id"] == row["id"]]
+            if not original_row.empty and row["category"] != original_row.iloc[0]["category"]:
+                conn.execute("UPDATE transactions SET category = ? WHERE id = ?", (row["category"], row["id"]))
+                database.add_keyword(row["category"], row["details"])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--edits", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "seed.db")
+        database.init_db()
+        database.insert_transactions(make_statement(args.rows))
+        debits = database.load_transactions()
+        debits = debits[debits["debit_or_credit"] == "Debit"][["id", "date", "details", "amount", "category"]]
+
+        rng = np.random.default_rng(0)
+        edited_df = debits.copy()
+        rows = rng.choice(len(edited_df), args.edits, replace=False)
+        edited_df.iloc[rows, edited_df.columns.get_loc("category")] = rng.choice(CATEGORIES, args.edits)
+        database.close_connection()
+
+        print(f"{len(debits):,} expenses, {args.edits} edited")
+        for name, apply in (("row-by-row loop", apply_loop), ("merge + batched", database.apply_category_edits)):
+            path = os.path.join(tmp, f"{apply.__name__}.db")
+            shutil.copy(os.path.join(tmp, "seed.db"), path)
+            database.DB_FILE = path
+            start = time.perf_counter()
+            apply(edited_df, debits)
+            seconds = time.perf_counter() - start
+            #the loop's later keywords can recategorize rows edited earlier in
+            #the same click, the batched version sets the edited rows last
+            saved = database.load_transactions().set_index("id")["category"]
+            wanted = edited_df.iloc[rows].set_index("id")["category"]
+            kept = (saved.loc[wanted.index] == wanted).sum()
+            print(f"{name:16} {seconds:8.3f}s  {kept}/{args.edits} edits kept")
+
+if __name__ == "__main__":
+    main()
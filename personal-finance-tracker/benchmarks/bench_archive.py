@@ -0,0 +1,47 @@
+#loading a long history from sqlite vs from the arrow archive of closed
+#months (needs pyarrow), plus a one-month date range, on a throwaway
+#database. run from the personal-finance-tracker folder:
+#   python benchmarks/bench_archive.py --rows 1000000
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import archive
+import database
+from bench_ingest import make_statement
+
+#seconds and rows of an uncached load
+def timed_load(*args):
+    database._cache.clear()
+    start = time.perf_counter()
+    rows = len(database.load_transactions(*args))
+    return time.perf_counter() - start, rows
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+    if not archive.available():
+        sys.exit("pyarrow is not installed (pip install pyarrow)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        database.init_db()
+        database.insert_transactions(make_statement(args.rows))
+
+        results = {"sqlite": timed_load(), "sqlite, one month": timed_load("2020-06-01", "2020-07-01")}
+        start = time.perf_counter()
+        months = database.archive_closed_months()
+        print(f"archived {len(months)} months in {time.perf_counter() - start:.2f}s")
+        results["archive"] = timed_load()
+        results["archive, one month"] = timed_load("2020-06-01", "2020-07-01")
+
+        for name, (seconds, rows) in results.items():
+            print(f"{name:20} {seconds:7.3f}s  {rows:,} rows")
+
+if __name__ == "__main__":
+    main()
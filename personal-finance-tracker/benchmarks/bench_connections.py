@@ -0,0 +1,97 @@
+#the shared connection and unit_of_work vs a new sqlite3 connection and
+#commit per helper call (how database.py worked before), on throwaway
+#databases. run from the personal-finance-tracker folder:
+#   python benchmarks/bench_connections.py --rows 100000 --edits 50
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import nullcontext
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from bench_ingest import make_statement
+from categorizer import KeywordMatcher
+
+#the helpers as they were, one connection and commit each
+def connect_per_call(path):
+    def get_categories():
+        with sqlite3.connect(path) as conn:
+            return [row[0] for row in conn.execute("SELECT name FROM categories").fetchall()]
+
+    def add_category(name):
+        with sqlite3.connect(path) as conn:
+            conn.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (name,))
+            conn.commit()
+
+    def add_keyword(category, keyword):
+        add_category(category)
+        keyword = keyword.strip().lower()
+        with sqlite3.connect(path) as conn:
+            conn.execute("DELETE FROM keywords WHERE keyword = ?", (keyword,))
+            conn.execute("INSERT INTO keywords (category, keyword) VALUES (?, ?)", (category, keyword))
+            rows = database._rows_containing(conn, keyword)
+            database._recategorize(conn, rows, KeywordMatcher(database._keyword_rules(conn)))
+            conn.commit()
+
+    def update_category(transaction_id, category):
+        with sqlite3.connect(path) as conn:
+            conn.execute("UPDATE transactions SET category = ? WHERE id = ?", (category, transaction_id))
+            conn.commit()
+
+    return get_categories, add_keyword, update_category
+
+def shared():
+    def update_category(transaction_id, category):
+        with database.unit_of_work() as conn:
+            conn.execute("UPDATE transactions SET category = ? WHERE id = ?", (category, transaction_id))
+    return database.get_categories, database.add_keyword, update_category
+
+#reads, then an Apply Changes click editing the category of `edits` rows
+def run(helpers, edits, reads, unit):
+    get_categories, add_keyword, update_category = helpers
+    start = time.perf_counter()
+    for _ in range(reads):
+        get_categories()
+    read_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with unit():
+        for number in range(edits):
+            update_category(number + 1, "Shopping")
+            add_keyword("Shopping", f"merchant {number * 97 % 5000} dubai")
+    return read_seconds, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--edits", type=int, default=50)
+    parser.add_argument("--reads", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shared_path = os.path.join(tmp, "shared.db")
+        database.DB_FILE = shared_path
+        database.init_db()
+        database.insert_transactions(make_statement(args.rows))
+
+        #same data for the old helpers, in sqlite's default rollback journal mode
+        old_path = os.path.join(tmp, "per_call.db")
+        with sqlite3.connect(old_path) as copy, database.get_connection() as conn:
+            conn.backup(copy)
+            copy.execute("PRAGMA journal_mode=DELETE")
+
+        results = {
+            "connection per call": run(connect_per_call(old_path), args.edits, args.reads, nullcontext),
+            "shared + unit_of_work": run(shared(), args.edits, args.reads, database.unit_of_work),
+        }
+        print(f"{args.rows:,} transactions, {args.reads:,} reads, {args.edits} edits in one Apply Changes")
+        for name, (read_seconds, edit_seconds) in results.items():
+            print(f"{name:22} reads {read_seconds * 1000000 / args.reads:7.0f} us each   "
+                  f"apply changes {edit_seconds * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
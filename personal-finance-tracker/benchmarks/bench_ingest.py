@@ -0,0 +1,49 @@
+#importing a large statement into a throwaway database: a first import of
+#new rows, then the same file again (every row a duplicate). run from the
+#personal-finance-tracker folder:
+#   python benchmarks/bench_ingest.py --rows 1000000
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+def make_statement(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "date": pd.Timestamp("2015-01-01") + pd.to_timedelta(rng.integers(0, 3650, rows), unit="D"),
+        "details": pd.Series(rng.integers(0, 5000, rows)).map(lambda n: f"MERCHANT {n} DUBAI"),
+        "amount": rng.integers(100, 500000, rows) / 100,
+        "debit_or_credit": np.where(rng.random(rows) < 0.9, "Debit", "Credit"),
+        "category": "Uncategorized",
+    })
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    df = make_statement(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        database.init_db()
+
+        start = time.perf_counter()
+        inserted, skipped = database.insert_transactions(df)
+        first = time.perf_counter() - start
+        print(f"first import    {first:6.2f}s  {inserted:,} inserted, {skipped:,} skipped")
+
+        start = time.perf_counter()
+        inserted, skipped = database.insert_transactions(df)
+        again = time.perf_counter() - start
+        print(f"same file again {again:6.2f}s  {inserted:,} inserted, {skipped:,} skipped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#uploading statement csv files: the old whole-file read_csv vs the chunked
+#ingest pipeline (ingest.py), into throwaway databases. run from the
+#personal-finance-tracker folder:
+#   python benchmarks/bench_statements.py --files 4 --rows 250000
+#peak memory is each process's max resident size, so run one mode at a time
+#(--mode old / --mode chunked) for a fair memory comparison. the worker
+#processes aren't counted here, watch them with ps/top (they hold a few
+#chunks each however big the file is)
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from bench_categorize import MERCHANTS, make_statement as make_details
+from categorizer import KeywordMatcher
+from ingest import ingest_statements
+
+#written 50k rows at a time so making the files doesn't set the peak memory
+def write_statement(path, rows, seed):
+    for start in range(0, rows, 50000):
+        count = min(50000, rows - start)
+        numbers = pd.Series(range(start, start + count))
+        df = make_details(count, seed * rows + start).rename(columns={"details": "Details"})
+        df.insert(0, "Date", (pd.Timestamp("2015-01-01") + pd.to_timedelta(numbers % 3650, unit="D")).dt.strftime("%d %b %Y"))
+        df["Amount"] = [f"{(n * 7919) % 500000 / 100:,.2f}" for n in numbers]
+        df["Currency"] = "AED"
+        df["Debit/Credit"] = ["Credit" if n % 10 == 0 else "Debit" for n in numbers]
+        df["Status"] = "SETTLED"
+        df.to_csv(path, index=False, mode="a" if start else "w", header=not start)
+
+#what main.py did before ingest.py: one read_csv per file, categorized and
+#inserted whole
+def ingest_old(paths, rules):
+    matcher = KeywordMatcher(rules)
+    for path in paths:
+        df = pd.read_csv(path)
+        df.columns = [col.strip() for col in df.columns]
+        df = df.rename(columns={"Date": "date", "Details": "details", "Amount": "amount", "Debit/Credit": "debit_or_credit"})
+        df["amount"] = df["amount"].str.replace(",", "").astype(float)
+        df["date"] = pd.to_datetime(df["date"], format="%d %b %Y")
+        df["category"] = matcher.categorize(df["details"])
+        database.insert_transactions(df)
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=250000, help="rows per file")
+    parser.add_argument("--mode", choices=["both", "old", "chunked"], default="both")
+    args = parser.parse_args()
+
+    rules = [(category, keyword) for category, keywords in MERCHANTS.items() for keyword in keywords]
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, f"statement{number}.csv") for number in range(args.files)]
+        for number, path in enumerate(paths):
+            write_statement(path, args.rows, number)
+        size = sum(os.path.getsize(path) for path in paths) / 1024 / 1024
+        print(f"{args.files} files, {args.files * args.rows:,} rows, {size:.0f} MB")
+        base = peak_mb()
+
+        if args.mode in ("both", "old"):
+            database.DB_FILE = os.path.join(tmp, "old.db")
+            database.init_db()
+            start = time.perf_counter()
+            ingest_old(paths, rules)
+            print(f"whole file  {time.perf_counter() - start:6.2f}s  peak {peak_mb():,.0f} MB (after writing files {base:,.0f} MB)")
+
+        if args.mode in ("both", "chunked"):
+            database.DB_FILE = os.path.join(tmp, "chunked.db")
+            database.init_db()
+            start = time.perf_counter()
+            results = ingest_statements(paths, rules)
+            seconds = time.perf_counter() - start
+            inserted = sum(result["inserted"] for result in results)
+            print(f"chunked     {seconds:6.2f}s  peak {peak_mb():,.0f} MB  ({inserted:,} inserted)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import threading
+from collections import OrderedDict
+
+#least recently used cache with a fixed number of entries. the oldest entry
+#is evicted when a new one doesn't fit, hits/misses/evictions are counted
+#for stats()
+class LRUCache:
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    #(True, value) on a hit, (False, None) on a miss
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    #drops every entry whose key stale(key) is true
+    def evict(self, stale):
+        with self._lock:
+            for key in [key for key in self._data if stale(key)]:
+                del self._data[key]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
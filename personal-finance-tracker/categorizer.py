@@ -0,0 +1,45 @@
+import re
+
+import pandas as pd
+
+UNCATEGORIZED = "Uncategorized"
+
+#matches transaction details against every keyword rule at once. all the
+#keywords are compiled into one regex, so a whole column is categorized in a
+#single vectorized pass instead of looping over categories and rows
+#
+#precedence (same everywhere the rules are applied):
+#  1. the keyword that starts earliest in the details wins
+#  2. if several start there, the longest one wins ("amazon ae prime" beats "amazon ae")
+#  3. if the same keyword is saved for two categories, the newest rule wins
+class KeywordMatcher:
+    #rules is a list of (category, keyword) pairs, oldest first
+    def __init__(self, rules):
+        self.categories = {}
+        for category, keyword in rules:
+            keyword = (keyword or "").strip().lower()
+            if not keyword or not category or category == UNCATEGORIZED:
+                continue
+            self.categories[keyword] = category
+
+        #longest first so the alternation prefers the longest keyword at a position
+        keywords = sorted(self.categories, key=lambda keyword: (-len(keyword), keyword))
+        self.pattern = re.compile("(" + "|".join(re.escape(keyword) for keyword in keywords) + ")") if keywords else None
+
+    #keyword that decides the category of one details string, or None.
+    #missing details (None, nan) match nothing, like in categorize
+    def match(self, details):
+        if self.pattern is None or details is None or pd.isna(details):
+            return None
+        found = self.pattern.search(str(details).strip().lower())
+        return found.group(1) if found else None
+
+    def categorize_one(self, details):
+        return self.categories.get(self.match(details), UNCATEGORIZED)
+
+    #series of categories for a series of details
+    def categorize(self, details):
+        if self.pattern is None or details.empty:
+            return pd.Series(UNCATEGORIZED, index=details.index, dtype=object)
+        matched = details.fillna("").astype(str).str.strip().str.lower().str.extract(self.pattern, expand=False)
+        return matched.map(self.categories).fillna(UNCATEGORIZED)
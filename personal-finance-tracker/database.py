@@ -1,28 +1,178 @@
+import copy
+import datetime
+import functools
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager
+
 import pandas as pd
 
+import archive
+from cache import LRUCache
+from categorizer import UNCATEGORIZED, KeywordMatcher
+
 DB_FILE = "finance_data.db"
 
-#connects file from user to database
+#rows per executemany call when inserting transactions
+INSERT_BATCH_SIZE = 10000
+
+#version of the transactions table layout, kept in PRAGMA user_version (see
+#_migrate)
+SCHEMA_VERSION = 1
+
+#prepared statements kept on the shared connection
+CACHED_STATEMENTS = 256
+#seconds to wait when another process is writing
+BUSY_TIMEOUT = 30
+#results kept by the read cache, a handful per data version
+CACHE_ENTRIES = 32
+
+#the app uses one connection to the database file, opened on first use and
+#kept across streamlit reruns (the module is only imported once). streamlit
+#runs each session in its own thread, so every use holds _lock
+_lock = threading.RLock()
+_connection = None
+_connection_file = None
+_units = 0
+
+def _shared_connection():
+    global _connection, _connection_file
+    if _connection is None or _connection_file != DB_FILE:
+        if _connection is not None:
+            _connection.close()
+        #transactions are started by unit_of_work, not by the sqlite3 module
+        _connection = sqlite3.connect(
+            DB_FILE, timeout=BUSY_TIMEOUT, isolation_level=None,
+            check_same_thread=False, cached_statements=CACHED_STATEMENTS,
+        )
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute("PRAGMA synchronous=NORMAL")
+        _connection_file = DB_FILE
+    return _connection
+
+#closes the shared connection, the next use opens it again
+def close_connection():
+    global _connection, _connection_file
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+        _connection = None
+        _connection_file = None
+
+#connects file from user to database, for reading. inside a unit_of_work
+#it sees the unit's writes before they are committed
+@contextmanager
 def get_connection():
-    return sqlite3.connect(DB_FILE)
+    with _lock:
+        yield _shared_connection()
+
+#runs a block of writes as one transaction, committed when the block ends or
+#rolled back if it raises. units started inside it join the outer one, so a
+#whole user action (like Apply Changes) commits once
+@contextmanager
+def unit_of_work():
+    global _units
+    with _lock:
+        conn = _shared_connection()
+        if _units:
+            _units += 1
+            try:
+                yield conn
+            finally:
+                _units -= 1
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        _units = 1
+        changes = conn.total_changes
+        try:
+            yield conn
+            #a unit that wrote anything moves the data version on, which is
+            #what the read cache is keyed on
+            if conn.total_changes != changes:
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_version'")
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            _units = 0
+
+_cache = LRUCache(CACHE_ENTRIES)
+_cache_version = {}
+
+def _data_version(conn):
+    return conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()[0]
+
+#caches what fn returns for each data version, so streamlit reruns and other
+#sessions get it without querying again until something is written. every
+#caller gets its own copy of the cached dataframe, dict or list, so changing
+#it in place (main.py sets columns on them) can't change the cached one.
+#reads inside a unit_of_work can see uncommitted writes, so they skip the cache
+def _cached(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with get_connection() as conn:
+            if _units:
+                return fn(*args, **kwargs)
+            version = _data_version(conn)
+            #results for older versions can't be used again
+            if version != _cache_version.get(DB_FILE):
+                _cache.evict(lambda key: key[0] == DB_FILE and key[1] != version)
+                _cache_version[DB_FILE] = version
+            key = (DB_FILE, version, fn.__name__, args, tuple(sorted(kwargs.items())))
+            found, value = _cache.get(key)
+            if not found:
+                value = fn(*args, **kwargs)
+                _cache.set(key, value)
+        return value.copy(deep=True) if isinstance(value, pd.DataFrame) else copy.deepcopy(value)
+    return wrapper
+
+#hits, misses, evictions and size of the read cache
+def cache_stats():
+    return _cache.stats()
+
+#database files init_db has already run on in this process
+_initialized = set()
+
+#per row triggers on inserts into transactions that earlier versions created.
+#they made large imports several times slower, insert_transactions does
+#their work once per batch instead
+OLD_TRIGGERS = ["transactions_details_insert", "transactions_rollup_insert", "transactions_archive_insert"]
 
 #creates tables for transactions, categories, and keywords for auto-categorization
 #execute sends statement with command to database
-#needs id to access rows later
+#needs id to access rows later. main.py calls it on every streamlit rerun,
+#after the first call for a file it returns straight away
 def init_db():
-    with get_connection() as conn:
+    if DB_FILE in _initialized:
+        return
+    with unit_of_work() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS transactions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 date TEXT,
                 details TEXT,
-                amount REAL,
+                amount_cents INTEGER,
                 debit_or_credit TEXT,
                 category TEXT DEFAULT 'Uncategorized'
             )
         ''')
+        _migrate(conn)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', 0)")
+        triggers = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        for name in OLD_TRIGGERS:
+            if name in triggers:
+                cursor.execute(f"DROP TRIGGER {name}")
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS categories (
                 name TEXT PRIMARY KEY
@@ -36,20 +186,191 @@ def init_db():
                 FOREIGN KEY (category) REFERENCES categories(name)
             )
         ''')
-        conn.commit()
+        #a transaction is identified by its date, amount, type and details.
+        #older databases can already hold duplicates, keep the first copy
+        #of each before adding the unique index. once the index exists there
+        #can't be any, so this only runs the first time
+        fingerprint_exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'ux_transactions_details_fingerprint'"
+        ).fetchone()
+        if not fingerprint_exists:
+            cursor.execute('''
+                DELETE FROM transactions WHERE id NOT IN (
+                    SELECT MIN(id) FROM transactions
+                    GROUP BY date, amount_cents, debit_or_credit, details
+                )
+            ''')
+            #details comes first so the index also finds transactions by
+            #details (see _rows_containing). replaces the first version of
+            #this index
+            cursor.execute("DROP INDEX IF EXISTS ux_transactions_fingerprint")
+            cursor.execute('''
+                CREATE UNIQUE INDEX ux_transactions_details_fingerprint
+                ON transactions (details, date, amount_cents, debit_or_credit)
+            ''')
+        #dates are YYYY-MM-DD text, so ranges of them are index ranges
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_transactions_date ON transactions (date)")
+
+        #every distinct details text once, with a trigram index over it, so a
+        #new keyword only looks at the transactions that contain it (see
+        #add_keyword). statements repeat the same merchants, so this stays far
+        #smaller than transactions. insert_transactions adds new details once
+        #per batch (_after_insert), triggers cover edits and the fts index
+        details_exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'transaction_details'"
+        ).fetchone()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS transaction_details (
+                details TEXT PRIMARY KEY
+            )
+        ''')
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS transaction_details_fts USING fts5(
+                details, content='transaction_details', tokenize='trigram'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS transaction_details_fts_insert AFTER INSERT ON transaction_details BEGIN
+                INSERT INTO transaction_details_fts (rowid, details) VALUES (new.rowid, new.details);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS transactions_details_update AFTER UPDATE OF details ON transactions
+            WHEN new.details IS NOT NULL BEGIN
+                INSERT OR IGNORE INTO transaction_details (details) VALUES (new.details);
+            END
+        ''')
+        if not details_exists:
+            cursor.execute('''
+                INSERT OR IGNORE INTO transaction_details (details)
+                SELECT DISTINCT details FROM transactions WHERE details IS NOT NULL
+            ''')
+
+        #totals per (month, category, debit/credit) for the dashboard, so
+        #its summaries and charts don't group every transaction on each
+        #rerun. insert_transactions adds each batch's totals (_after_insert),
+        #triggers take away and add back transactions as they are
+        #recategorized, edited or deleted
+        rollup_exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'monthly_rollup'"
+        ).fetchone()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS monthly_rollup (
+                month TEXT,
+                category TEXT,
+                debit_or_credit TEXT,
+                amount_cents INTEGER,
+                count INTEGER,
+                PRIMARY KEY (month, category, debit_or_credit)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS transactions_rollup_delete AFTER DELETE ON transactions BEGIN
+                UPDATE monthly_rollup SET amount_cents = amount_cents - coalesce(old.amount_cents, 0), count = count - 1
+                WHERE month = coalesce(substr(old.date, 1, 7), '') AND category = coalesce(old.category, 'Uncategorized')
+                  AND debit_or_credit = coalesce(old.debit_or_credit, '');
+                DELETE FROM monthly_rollup
+                WHERE month = coalesce(substr(old.date, 1, 7), '') AND category = coalesce(old.category, 'Uncategorized')
+                  AND debit_or_credit = coalesce(old.debit_or_credit, '') AND count <= 0;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS transactions_rollup_update
+            AFTER UPDATE OF date, amount_cents, debit_or_credit, category ON transactions BEGIN
+                UPDATE monthly_rollup SET amount_cents = amount_cents - coalesce(old.amount_cents, 0), count = count - 1
+                WHERE month = coalesce(substr(old.date, 1, 7), '') AND category = coalesce(old.category, 'Uncategorized')
+                  AND debit_or_credit = coalesce(old.debit_or_credit, '');
+                DELETE FROM monthly_rollup
+                WHERE month = coalesce(substr(old.date, 1, 7), '') AND category = coalesce(old.category, 'Uncategorized')
+                  AND debit_or_credit = coalesce(old.debit_or_credit, '') AND count <= 0;
+                INSERT INTO monthly_rollup (month, category, debit_or_credit, amount_cents, count)
+                VALUES (
+                    coalesce(substr(new.date, 1, 7), ''), coalesce(new.category, 'Uncategorized'),
+                    coalesce(new.debit_or_credit, ''), coalesce(new.amount_cents, 0), 1
+                )
+                ON CONFLICT DO UPDATE SET amount_cents = amount_cents + excluded.amount_cents, count = count + 1;
+            END
+        ''')
+        if not rollup_exists:
+            rebuild_rollup(conn)
+
+        #months copied to the columnar archive (archive.py). any change to a
+        #month's transactions takes it off the list, so it is read from
+        #sqlite again until it is archived anew. triggers handle edits and
+        #deletes, insert_transactions new rows (_after_insert)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS archive_manifest (
+                month TEXT PRIMARY KEY,
+                rows INTEGER
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS transactions_archive_delete AFTER DELETE ON transactions BEGIN
+                DELETE FROM archive_manifest WHERE month = substr(old.date, 1, 7);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS transactions_archive_update AFTER UPDATE ON transactions BEGIN
+                DELETE FROM archive_manifest WHERE month IN (substr(old.date, 1, 7), substr(new.date, 1, 7));
+            END
+        ''')
+    _initialized.add(DB_FILE)
+
+#moves a database from before SCHEMA_VERSION to the current layout. version
+#1 stores amounts as whole cents (floats drifted when summed) and dates as
+#plain YYYY-MM-DD. sqlite can't change a column's type, so the table is
+#copied into a new one, its indexes and triggers are created again by
+#init_db afterwards
+def _migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(transactions)")]
+    if version < 1 and "amount" in columns:
+        conn.execute('''
+            CREATE TABLE transactions_v1 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT,
+                details TEXT,
+                amount_cents INTEGER,
+                debit_or_credit TEXT,
+                category TEXT DEFAULT 'Uncategorized'
+            )
+        ''')
+        conn.execute('''
+            INSERT INTO transactions_v1 (id, date, details, amount_cents, debit_or_credit, category)
+            SELECT id, substr(date, 1, 10), details, CAST(round(amount * 100) AS INTEGER), debit_or_credit, category
+            FROM transactions
+        ''')
+        conn.execute("DROP TABLE transactions")
+        conn.execute("ALTER TABLE transactions_v1 RENAME TO transactions")
+        #its totals were floats, init_db recounts them
+        conn.execute("DROP TABLE IF EXISTS monthly_rollup")
+    if version < SCHEMA_VERSION:
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+#recounts monthly_rollup from the transactions table
+def rebuild_rollup(conn):
+    conn.execute("DELETE FROM monthly_rollup")
+    conn.execute('''
+        INSERT INTO monthly_rollup (month, category, debit_or_credit, amount_cents, count)
+        SELECT coalesce(substr(date, 1, 7), ''), coalesce(category, 'Uncategorized'),
+               coalesce(debit_or_credit, ''), sum(coalesce(amount_cents, 0)), count(*)
+        FROM transactions
+        GROUP BY 1, 2, 3
+    ''')
 
 #adds a new category to database if doesn't exist
 def add_category(name):
-    with get_connection() as conn: 
+    with unit_of_work() as conn:
         conn.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (name,))
-        conn.commit()
 
 #returns a list of category names
+@_cached
 def get_categories():
     with get_connection() as conn:
         return [row[0] for row in conn.execute("SELECT name FROM categories").fetchall()]
     
 #returns a dictionary mapping each category to a list of keywords
+@_cached
 def get_keywords():
     with get_connection() as conn:
         cursor = conn.execute("SELECT category, keyword FROM keywords")
@@ -58,70 +379,268 @@ def get_keywords():
             keywords.setdefault(category, []).append(keyword.strip().lower())
         return keywords
     
-def add_keyword(category, keyword):
-    add_category(category)
-    keyword = keyword.strip().lower()
+def _keyword_rules(conn):
+    return conn.execute("SELECT category, keyword FROM keywords ORDER BY rowid").fetchall()
 
+#returns (category, keyword) pairs oldest first, for KeywordMatcher
+@_cached
+def get_keyword_rules():
     with get_connection() as conn:
-        conn.execute('''
-            INSERT OR IGNORE INTO keywords (category, keyword)
+        return _keyword_rules(conn)
+
+#(id, details, category) of the transactions whose details contain keyword.
+#the trigram index needs at least 3 characters, shorter keywords scan the
+#distinct details instead
+def _rows_containing(conn, keyword):
+    if len(keyword) >= 3:
+        phrase = '"' + keyword.replace('"', '""') + '"'
+        matching = '''
+            SELECT d.details FROM transaction_details_fts f
+            JOIN transaction_details d ON d.rowid = f.rowid
+            WHERE transaction_details_fts MATCH ?
+        '''
+    else:
+        phrase = keyword
+        matching = "SELECT details FROM transaction_details WHERE instr(LOWER(details), ?) > 0"
+    return conn.execute(f'''
+        SELECT id, details, category FROM transactions
+        WHERE details IN ({matching})
+    ''', (phrase,)).fetchall()
+
+#re-runs the matcher over (id, details, category) rows and saves the ones
+#whose category changes. rows no keyword matches keep their category
+def _recategorize(conn, rows, matcher):
+    if not rows:
+        return 0
+    df = pd.DataFrame(rows, columns=["id", "details", "category"])
+    df["new_category"] = matcher.categorize(df["details"])
+    changed = df[(df["new_category"] != UNCATEGORIZED) & (df["new_category"] != df["category"])]
+    conn.executemany(
+        "UPDATE transactions SET category = ? WHERE id = ?",
+        zip(changed["new_category"].tolist(), changed["id"].tolist()),
+    )
+    return len(changed)
+
+#saves a keyword rule and recategorizes only the transactions containing it,
+#with every rule's precedence applied (see categorizer.py)
+def add_keyword(category, keyword):
+    add_keywords([(category, keyword)])
+
+#saves many (category, keyword) rules at once, a later pair for the same
+#keyword wins like a later add_keyword call would. the transactions
+#containing any of the keywords are recategorized together, once
+def add_keywords(rules):
+    rules = list(rules)
+    latest = {}
+    for category, keyword in rules:
+        keyword = (keyword or "").strip().lower()
+        if keyword:
+            latest.pop(keyword, None)
+            latest[keyword] = category
+
+    with unit_of_work() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO categories (name) VALUES (?)",
+            [(category,) for category in dict.fromkeys(category for category, _ in rules)],
+        )
+        if not latest:
+            return
+        #the newest rule for a keyword always wins, so older ones are dropped
+        conn.executemany("DELETE FROM keywords WHERE keyword = ?", [(keyword,) for keyword in latest])
+        conn.executemany('''
+            INSERT INTO keywords (category, keyword)
             VALUES (?, ?)
-        ''', (category, keyword))
+        ''', [(category, keyword) for keyword, category in latest.items()])
 
-        #updates transactions with matching details
-        conn.execute('''
-            UPDATE transactions
-            SET category = ?
-            WHERE LOWER(TRIM(details)) = ?
-        ''', (category, keyword))
-
-        # Also update transactions that match any keyword in the list 
-        # Get all keywords for this category
-        cursor = conn.execute('SELECT keyword FROM keywords WHERE category = ?', (category,))
-        keyword_list = [row[0].strip().lower() for row in cursor]
-        
-        # For each keyword, update transactions whose details *contain* that keyword
-        for kw in keyword_list:
-            conn.execute('''
-                UPDATE transactions
-                SET category = ?
-                WHERE LOWER(details) LIKE ?
-            ''', (category, f"%{kw}%"))
-        
-        conn.commit()
+        rows = {}
+        for keyword in latest:
+            rows.update((row[0], row) for row in _rows_containing(conn, keyword))
+        _recategorize(conn, list(rows.values()), KeywordMatcher(_keyword_rules(conn)))
+
+#sets the category of transactions from (category, id) pairs
+def update_categories(changes):
+    with unit_of_work() as conn:
+        conn.executemany("UPDATE transactions SET category = ? WHERE id = ?", changes)
 
+#saves the categories changed in the expense editor. edited and original
+#have id, details and category columns and are lined up on id, an empty
+#category counts as Uncategorized. one transaction for the whole click: the
+#keywords go first and recategorize whatever they match, then the edited
+#rows are set so the categories picked there always stick. returns how many
+#rows were changed
+def apply_category_edits(edited, original):
+    merged = edited[["id", "details", "category"]].merge(
+        original[["id", "category"]], on="id", suffixes=("", "_original")
+    )
+    merged["category"] = merged["category"].fillna(UNCATEGORIZED)
+    changed = merged[merged["category"] != merged["category_original"].fillna(UNCATEGORIZED)]
+    if changed.empty:
+        return 0
+    with unit_of_work():
+        add_keywords(zip(changed["category"].tolist(), changed["details"].tolist()))
+        update_categories(zip(changed["category"].tolist(), changed["id"].tolist()))
+    return len(changed)
+
+#recategorizes every transaction from scratch, only needed if the rules were
+#changed outside the app. new uploads are categorized as they are inserted
 def reapply_keywords():
-    keywords = get_keywords()
-    with get_connection() as conn:
-        for category, keyword_list in keywords.items():
-            for keyword in keyword_list:
-                conn.execute('''
-                    UPDATE transactions
-                    SET category = ?
-                    WHERE LOWER(details) LIKE ?
-                ''', (category, f"%{keyword}%"))
-        conn.commit()
-
-#takes a pandas dataframe and saves each row to transactions table
+    with unit_of_work() as conn:
+        matcher = KeywordMatcher(_keyword_rules(conn))
+        for chunk in pd.read_sql_query("SELECT id, details, category FROM transactions", conn, chunksize=50000):
+            _recategorize(conn, list(chunk.itertuples(index=False, name=None)), matcher)
+
+#takes a pandas dataframe and saves its rows to the transactions table.
+#rows already saved (same date, amount, type and details) are skipped by the
+#unique index, returns (inserted, skipped) counts
 def insert_transactions(df):
-    df["date"] = df["date"].dt.date
+    rows = pd.DataFrame({
+        "date": df["date"].dt.strftime("%Y-%m-%d"),
+        #whole cents. they stay floats here so a missing amount is still
+        #saved as NULL, the INTEGER column stores 1234.0 as 1234
+        "amount_cents": (df["amount"] * 100).round(),
+        "debit_or_credit": df["debit_or_credit"],
+        "details": df["details"],
+        "category": df["category"],
+    })
+    with unit_of_work() as conn:
+        inserted = 0
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            batch = rows.iloc[start:start + INSERT_BATCH_SIZE]
+            #ids only go up (AUTOINCREMENT), the batch's new rows come after this
+            last_id = conn.execute("SELECT coalesce(max(id), 0) FROM transactions").fetchone()[0]
+            #rowcount leaves out the rows written by triggers
+            count = conn.executemany('''
+                INSERT OR IGNORE INTO transactions (date, amount_cents, debit_or_credit, details, category)
+                VALUES (?, ?, ?, ?, ?)
+            ''', zip(*(batch[column].tolist() for column in batch.columns))).rowcount
+            if count:
+                _after_insert(conn, last_id)
+            inserted += count
+    return inserted, len(rows) - inserted
+
+#what per row insert triggers would do, for the transactions with ids above
+#last_id, in one statement per table. NOT INDEXED keeps sqlite on the id
+#range, otherwise it walks the whole details index on every batch
+def _after_insert(conn, last_id):
+    conn.execute('''
+        INSERT OR IGNORE INTO transaction_details (details)
+        SELECT DISTINCT details FROM transactions NOT INDEXED
+        WHERE id > ? AND details IS NOT NULL
+    ''', (last_id,))
+    conn.execute('''
+        INSERT INTO monthly_rollup (month, category, debit_or_credit, amount_cents, count)
+        SELECT coalesce(substr(date, 1, 7), ''), coalesce(category, 'Uncategorized'),
+               coalesce(debit_or_credit, ''), sum(coalesce(amount_cents, 0)), count(*)
+        FROM transactions NOT INDEXED
+        WHERE id > ?
+        GROUP BY 1, 2, 3
+        ON CONFLICT DO UPDATE SET amount_cents = amount_cents + excluded.amount_cents, count = count + excluded.count
+    ''', (last_id,))
+    conn.execute('''
+        DELETE FROM archive_manifest WHERE month IN (
+            SELECT DISTINCT substr(date, 1, 7) FROM transactions NOT INDEXED WHERE id > ?
+        )
+    ''', (last_id,))
+
+def _archive_dir():
+    return os.path.splitext(DB_FILE)[0] + "_archive"
+
+#"YYYY-MM" of the month after month
+def _next_month(month):
+    year, number = map(int, month.split("-"))
+    return f"{year + number // 12}-{number % 12 + 1:02d}"
+
+#where clause (and params) for the dates outside the archived months
+def _unarchived_dates(archived):
+    ranges, lower = [], None
+    for month in archived:
+        if lower != month + "-01":
+            ranges.append((lower, month + "-01"))
+        lower = _next_month(month) + "-01"
+    ranges.append((lower, None))
+
+    terms, params = ["date IS NULL"], []
+    for lower, upper in ranges:
+        bounds = []
+        if lower is not None:
+            bounds.append("date >= ?")
+            params.append(lower)
+        if upper is not None:
+            bounds.append("date < ?")
+            params.append(upper)
+        terms.append("(" + " AND ".join(bounds) + ")")
+    return "(" + " OR ".join(terms) + ")", params
+
+#loads saved transactions into a dataframe for display, optionally only
+#those dated from start up to (not including) end ("YYYY-MM-DD"). archived
+#months are read from their files, the rest from sqlite by date ranges on
+#the date index
+@_cached
+def load_transactions(start=None, end=None):
     with get_connection() as conn:
-        for _, row in df.iterrows():
-            #prevents duplicates - file being added continuously
-            exists = conn.execute('''
-                SELECT 1 FROM transactions
-                WHERE date = ? AND amount = ? AND debit_or_credit = ? AND details = ?
-            ''', (row["date"], row["amount"], row["debit_or_credit"], row["details"])
-            ).fetchone()
-            
-            if not exists:
-                conn.execute('''
-                    INSERT INTO transactions (date, amount, debit_or_credit, details, category)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (row["date"], row["amount"], row["debit_or_credit"], row["details"], row["category"]))
-        conn.commit()
-
-#loads saved transactions into a dataframe for display
-def load_transactions():
+        archived = []
+        if archive.available():
+            archived = [
+                month for (month,) in conn.execute("SELECT month FROM archive_manifest ORDER BY month")
+                if (start is None or _next_month(month) + "-01" > start)
+                and (end is None or month + "-01" < end)
+                and os.path.exists(archive.month_path(_archive_dir(), month))
+            ]
+
+        where, params = _unarchived_dates(archived) if archived else ("1", [])
+        if start is not None:
+            where += " AND date >= ?"
+            params.append(start)
+        if end is not None:
+            where += " AND date < ?"
+            params.append(end)
+        df = pd.read_sql_query(
+            f"SELECT {', '.join(archive.COLUMNS)} FROM transactions WHERE {where} ORDER BY id",
+            conn, params=params,
+        )
+
+    if archived:
+        saved = archive.read_months(_archive_dir(), archived)
+        if start is not None:
+            saved = saved[saved["date"] >= start]
+        if end is not None:
+            saved = saved[saved["date"] < end]
+        #an empty frame from sqlite would turn the archived columns into objects
+        df = pd.concat([saved, df] if len(df) else [saved], ignore_index=True).sort_values("id", ignore_index=True)
+
+    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d")
+    df.insert(3, "amount", df.pop("amount_cents") / 100)
+    return df
+
+#copies every month before the current one that isn't archived (or has
+#changed since) to the archive, returns the months written. needs pyarrow
+def archive_closed_months(today=None):
+    if not archive.available():
+        raise RuntimeError("the archive needs pyarrow (pip install pyarrow)")
+    current = (today or datetime.date.today()).strftime("%Y-%m")
+    columns = ", ".join(archive.COLUMNS)
+    with unit_of_work() as conn:
+        months = [month for (month,) in conn.execute('''
+            SELECT DISTINCT month FROM monthly_rollup
+            WHERE month != '' AND month < ? AND month NOT IN (SELECT month FROM archive_manifest)
+            ORDER BY month
+        ''', (current,))]
+        for month in months:
+            df = pd.read_sql_query(
+                f"SELECT {columns} FROM transactions WHERE date >= ? AND date < ?",
+                conn, params=(month + "-01", _next_month(month) + "-01"),
+            )
+            archive.write_month(_archive_dir(), month, df)
+            conn.execute("INSERT INTO archive_manifest (month, rows) VALUES (?, ?)", (month, len(df)))
+    return months
+
+#monthly totals as a dataframe of month ("YYYY-MM"), category, amount and
+#count, for one type of transaction ("Debit" or "Credit")
+@_cached
+def load_rollup(debit_or_credit):
     with get_connection() as conn:
-        return pd.read_sql_query("SELECT * FROM transactions", conn, parse_dates=["date"])
\ No newline at end of file
+        return pd.read_sql_query('''
+            SELECT month, category, amount_cents / 100.0 AS amount, count FROM monthly_rollup
+            WHERE debit_or_credit = ?
+            ORDER BY month, category
+        ''', conn, params=(debit_or_credit,))
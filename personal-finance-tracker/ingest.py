@@ -0,0 +1,160 @@
+import multiprocessing
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from categorizer import KeywordMatcher
+from database import insert_transactions
+
+#statement uploads are read in chunks instead of all at once. each file is
+#parsed and categorized in its own worker process, the chunks come back
+#through a bounded queue and the app saves them one at a time as they arrive,
+#so memory stays at a few chunks however big or many the files are.
+#the workers live in this module (not main.py) so the spawned processes
+#don't run the streamlit script
+
+#rows read from a file at a time
+CHUNK_ROWS = 50000
+#chunks waiting to be saved before the workers pause
+QUEUE_CHUNKS = 4
+#files read at the same time
+INGEST_WORKERS = os.cpu_count() or 1
+#seconds a worker waits for room on the queue before checking if the ingest
+#was cancelled
+PUT_TIMEOUT = 0.5
+
+DATE_FORMAT = "%d %b %Y"
+
+#statement column -> transactions column
+COLUMNS = {
+    "Date": "date",
+    "Details": "details",
+    "Amount": "amount",
+    "Debit/Credit": "debit_or_credit",
+}
+DTYPES = {
+    "Date": str,
+    "Details": str,
+    "Amount": str,
+    "Debit/Credit": "category",
+}
+
+#parses the dates not seen in an earlier chunk, statements repeat the same
+#few hundred days over and over
+def parse_dates(values, cache):
+    new = [value for value in values.unique() if value not in cache]
+    if new:
+        cache.update(zip(new, pd.to_datetime(pd.Series(new), format=DATE_FORMAT)))
+    return pd.to_datetime(values.map(cache))
+
+#yields the statement in file as dataframes of at most chunk_rows rows with
+#the transactions columns (category not set yet)
+def read_statement(file, chunk_rows=CHUNK_ROWS):
+    #header names can have stray spaces, only the columns we keep are read
+    header = pd.read_csv(file, nrows=0).columns
+    file.seek(0)
+    names = {column: column.strip() for column in header if column.strip() in COLUMNS}
+    if set(names.values()) != set(COLUMNS):
+        raise ValueError(f"Missing one or more required columns: {set(COLUMNS)}")
+
+    dates = {}
+    chunks = pd.read_csv(
+        file,
+        usecols=list(names),
+        dtype={column: DTYPES[name] for column, name in names.items()},
+        chunksize=chunk_rows,
+    )
+    for chunk in chunks:
+        chunk = chunk.rename(columns=names).rename(columns=COLUMNS)
+        chunk["amount"] = chunk["amount"].str.replace(",", "", regex=False).astype(float)
+        chunk["date"] = parse_dates(chunk["date"], dates)
+        yield chunk
+
+_chunks = None
+_cancel = None
+
+def _init_worker(chunks, cancel):
+    global _chunks, _cancel
+    _chunks = chunks
+    _cancel = cancel
+    #a cancelled ingest stops reading the queue, so a worker mustn't wait on
+    #exit for its last chunks to be picked up
+    chunks.cancel_join_thread()
+
+#puts item on the queue, false if the ingest is cancelled before there's room
+def _put(item):
+    while not _cancel.is_set():
+        try:
+            _chunks.put(item, timeout=PUT_TIMEOUT)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+#worker: reads and categorizes one file, putting (index, bytes read, chunk)
+#on the queue and (index, None, None) when it's done
+def _read_file(index, path, rules, chunk_rows):
+    try:
+        matcher = KeywordMatcher(rules)
+        with open(path, "rb") as file:
+            for chunk in read_statement(file, chunk_rows):
+                chunk["category"] = matcher.categorize(chunk["details"])
+                if not _put((index, file.tell(), chunk)):
+                    return
+    finally:
+        _put((index, None, None))
+
+#reads, categorizes and saves the statement files at paths using the
+#(category, keyword) rules. on_progress(done, total) is called with bytes
+#read after every chunk. returns one {"inserted", "skipped", "error"} per
+#file, a file that fails partway keeps the chunks already saved. if saving
+#or on_progress raises, the workers are stopped and the error is raised
+def ingest_statements(paths, rules, on_progress=None, chunk_rows=CHUNK_ROWS):
+    results = [{"inserted": 0, "skipped": 0, "error": None} for _ in paths]
+    if not paths:
+        return results
+    sizes = [os.path.getsize(path) for path in paths]
+    read = [0] * len(paths)
+
+    #spawn rather than fork, streamlit runs threads in this process
+    context = multiprocessing.get_context("spawn")
+    chunks = context.Queue(QUEUE_CHUNKS)
+    cancel = context.Event()
+    workers = min(len(paths), INGEST_WORKERS)
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(chunks, cancel)) as pool:
+        futures = [pool.submit(_read_file, index, path, rules, chunk_rows) for index, path in enumerate(paths)]
+        try:
+            finished = 0
+            while finished < len(paths):
+                try:
+                    index, position, chunk = chunks.get(timeout=1)
+                except queue.Empty:
+                    #a worker died without saying it's done
+                    if all(future.done() for future in futures) and chunks.empty():
+                        break
+                    continue
+                if chunk is None:
+                    finished += 1
+                    continue
+                inserted, skipped = insert_transactions(chunk)
+                results[index]["inserted"] += inserted
+                results[index]["skipped"] += skipped
+                read[index] = position
+                if on_progress:
+                    on_progress(sum(read), sum(sizes))
+        finally:
+            #when this stops early (a database error, or streamlit stopping
+            #the script by raising in on_progress) workers can be waiting for
+            #room on the full queue, and shutting the pool down would wait on
+            #them forever
+            cancel.set()
+            pool.shutdown(cancel_futures=True)
+
+        for result, future in zip(results, futures):
+            error = future.exception()
+            if error is not None:
+                result["error"] = str(error)
+    return results
@@ -1,87 +1,89 @@
+import os
+import shutil
+import tempfile
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from datetime import datetime
+from datetime import datetime, timedelta
 from database import (
-    get_connection, init_db, insert_transactions, load_transactions,
-    add_category, get_categories, add_keyword, get_keywords, reapply_keywords
+    unit_of_work, init_db, insert_transactions, load_transactions,
+    add_category, get_categories, apply_category_edits, get_keyword_rules,
+    load_rollup, cache_stats, archive_closed_months
 )
+import archive
+from ingest import ingest_statements
 
 #uses streamlit to set title, icon, etc
 st.set_page_config(page_title="Simple Finance App", page_icon="💰", layout="wide")
 
+#months of transactions the tables show by default, older ones are picked
+#with the date range in the sidebar
+RECENT_MONTHS = 3
+
 #initialize database with tables
 init_db()
 
-def categorize_transactions(df):
-    #set every row to have a field uncategorized
-    df["category"] = "Uncategorized"
-    #get keyword dictionary
-    keywords = get_keywords()
-
-    #apply correct category
-    for category, keyword_list in keywords.items():
-        #category is invalid - uncategorized or keyword list is empty 
-        if category == "Uncategorized" or not keyword_list:
+#reads, categorizes and saves uploaded statements, see ingest.py
+def ingest_uploads(files):
+    progress = st.progress(0.0, text="Reading statements...")
+    with tempfile.TemporaryDirectory() as tmp:
+        #the worker processes read from disk, not from the uploads in memory
+        paths = []
+        for number, file in enumerate(files):
+            path = os.path.join(tmp, f"{number}.csv")
+            with open(path, "wb") as out:
+                shutil.copyfileobj(file, out)
+            paths.append(path)
+
+        def show(done, total):
+            progress.progress(min(done / total, 1.0) if total else 1.0, text="Reading statements...")
+        results = ingest_statements(paths, get_keyword_rules(), show)
+    progress.empty()
+
+    for file, result in zip(files, results):
+        if result["error"]:
+            st.error(f"Error processing {file.name}: {result['error']} - check CSV format")
             continue
-
-        for idx, row in df.iterrows():
-            #gets detail in each row (title of transaction)
-            details = row["details"].lower().strip()
-            #matches detail to a keyword if possible
-            if details in keyword_list:
-                df.at[idx, "category"] = category
-
-    return df
-
-def format_transactions(file):
-    try:
-        df = pd.read_csv(file)
-
-        #in pandas can load in cols of csv file
-        df.columns = [col.strip() for col in df.columns]
-
-        df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
-
-        expected_cols = {"Date", "Details", "Amount", "Debit/Credit"}
-        if not expected_cols.issubset(set(df.columns)):
-            raise ValueError(f"Missing one or more required columns: {expected_cols}")
-
-        df.rename(columns={
-            "Date": "date",
-            "Details": "details",
-            "Amount": "amount",
-            "Debit/Credit": "debit_or_credit",
-        }, inplace=True)
-
-        df["amount"] = df["amount"].str.replace(",", "").astype(float)
-        df["date"] = pd.to_datetime(df["date"], format="%d %b %Y")
-
-        return categorize_transactions(df)
-    except Exception as e:
-        st.error(f"Error processing file: {str(e)}")
-        return None
+        #streamlit keeps the uploads between reruns, only save them once
+        st.session_state["ingested"].add(file.file_id)
+        st.success(f"{file.name}: {result['inserted']} transactions saved, {result['skipped']} already saved were skipped")
 
 def main():
     st.title("Simple Finance Dashboard")
 
     #automatically stored in state
-    uploaded_file = st.file_uploader("Upload your transaction CSV file", type=["csv"])
-
-    if uploaded_file is not None:
-        df = format_transactions(uploaded_file)
-
-        if df is None:
-            st.error("File processing failed - check CSV format")
-            return
-        
-        insert_transactions(df)
-        st.success("Transactions uploaded and saved")
-        reapply_keywords()
-
-    df = load_transactions()
-
-    if df.empty:
+    uploaded_files = st.file_uploader("Upload your transaction CSV files", type=["csv"], accept_multiple_files=True)
+
+    ingested = st.session_state.setdefault("ingested", set())
+    new_files = [file for file in uploaded_files if file.file_id not in ingested]
+    if new_files:
+        ingest_uploads(new_files)
+
+    #the expense editor and the payments table only load the picked dates
+    today = datetime.today().date()
+    recent = (pd.Timestamp(today) - pd.DateOffset(months=RECENT_MONTHS)).date()
+    start = st.sidebar.date_input("Transactions from", value=recent)
+    end = st.sidebar.date_input("Transactions to", value=today)
+    df = load_transactions(start.isoformat(), (end + timedelta(days=1)).isoformat())
+
+    #summaries and charts read the monthly totals kept by the database
+    #instead of grouping every transaction again, they cover every date
+    debit_rollup = load_rollup("Debit")
+    credit_rollup = load_rollup("Credit")
+
+    #reads are cached until the data changes, counts are for every session
+    stats = cache_stats()
+    st.sidebar.caption(
+        f"Cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+        f"{stats['size']} entries, {stats['evictions']} evicted"
+    )
+
+    #closed months can be copied to the columnar archive when pyarrow is installed
+    if archive.available() and st.sidebar.button("Archive closed months"):
+        months = archive_closed_months()
+        st.sidebar.success(f"{len(months)} months archived")
+
+    if debit_rollup.empty and credit_rollup.empty:
         st.info("No transactions available yet.")
         return 
         
@@ -98,14 +100,15 @@ def main():
         debit_or_credit = st.selectbox("Type", ["Debit", "Credit"])
         category = st.selectbox("Category", get_categories() or ["Uncategorized"])
         if st.button("Add Transaction"):
-            insert_transactions(pd.DataFrame([{
-                "date": pd.to_datetime(date),
-                "details": details,
-                "amount": amount,
-                "debit_or_credit": debit_or_credit,
-                "category": category
-            }]))
-            add_category(category)
+            with unit_of_work():
+                insert_transactions(pd.DataFrame([{
+                    "date": pd.to_datetime(date),
+                    "details": details,
+                    "amount": amount,
+                    "debit_or_credit": debit_or_credit,
+                    "category": category
+                }]))
+                add_category(category)
             st.success("Transaction added.")
             st.rerun()
 
@@ -123,7 +126,6 @@ def main():
             if st.button("Add Category"):
                 if new_category not in get_categories():
                     add_category(new_category)
-                    reapply_keywords()
                     st.success(f"Category '{new_category}' added.")
                     st.rerun()
 
@@ -152,28 +154,8 @@ def main():
         save_button = st.button("Apply Changes", type="primary")
         #apply changes to database
         if save_button:
-            #compared edited to originally and chooses category based on keyword
-            changes_made = False
-            for idx, row in edited_df.iterrows():
-                transaction_id = row["id"]
-                new_cat = row["category"]
-
-                original_row = debits[debits["id"] == transaction_id]
-                if not original_row.empty:
-                    original_cat = original_row.iloc[0]["category"]
-
-                    if new_cat != original_cat:
-                        with get_connection() as conn:
-                            conn.execute(
-                                "UPDATE transactions SET category = ? WHERE id = ?",
-                                (new_cat, transaction_id)
-                            )
-                            conn.commit()
-
-                        add_keyword(new_cat, row["details"])
-                        changes_made = True
-            if changes_made:
-                reapply_keywords()
+            #only the rows whose category was changed are saved
+            if apply_category_edits(edited_df, debits):
                 st.success("Changes applied.")
                 st.rerun()
             else:
@@ -182,10 +164,10 @@ def main():
 
         st.subheader('Expense Summary')
 
-        total_expenses = debits["amount"].sum()
+        total_expenses = debit_rollup["amount"].sum()
         st.metric("Total Expenses", f"{total_expenses:,.2f} AED")
 
-        category_totals = debits.groupby("category")["amount"].sum().reset_index()
+        category_totals = debit_rollup.groupby("category")["amount"].sum().reset_index()
         category_totals = category_totals.sort_values("amount", ascending=False)
 
         st.dataframe(
@@ -209,19 +191,18 @@ def main():
         st.plotly_chart(fig, use_container_width=True)
 
         st.subheader("Monthly Expense Trend")
-        debits["month"] = debits["date"].dt.to_period("M").astype(str)
-        monthly = debits.groupby("month")["amount"].sum().reset_index()
+        monthly = debit_rollup.groupby("month")["amount"].sum().reset_index()
         fig = px.bar(monthly, x="month", y="amount")
         st.plotly_chart(fig, use_container_width=True)
 
         st.subheader("Category Over Time Heatmap")
-        heatmap_df = debits.groupby(["category", "month"])["amount"].sum().unstack(fill_value=0)
+        heatmap_df = debit_rollup.pivot(index="category", columns="month", values="amount").fillna(0)
         fig = px.imshow(heatmap_df, labels=dict(x="month", y="category", color="amount"))
         st.plotly_chart(fig, use_container_width=True)
 
     with tab2: 
         st.subheader("Payments Summary")
-        total_payments = credits["amount"].sum()
+        total_payments = credit_rollup["amount"].sum()
         st.metric("Total Payments", f"{total_payments:,.2f} AED")
         
         st.dataframe(
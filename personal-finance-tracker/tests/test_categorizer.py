@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from categorizer import UNCATEGORIZED, KeywordMatcher
+
+RULES = [
+    ("Shopping", "amazon ae"),
+    ("Subscriptions", "amazon ae prime"),
+    ("Groceries", "carrefour"),
+    ("Travel", "emirates"),
+    ("Insurance", "emirates insurance"),
+    ("Dining", "cafe"),
+    ("Groceries", "cafe"),
+]
+
+#each case goes through the single-row and the vectorized path
+def both(matcher, details):
+    one = [matcher.categorize_one(value) for value in details]
+    many = matcher.categorize(pd.Series(details, dtype=object)).tolist()
+    assert one == many
+    return one
+
+def test_earliest_keyword_wins():
+    matcher = KeywordMatcher(RULES)
+    assert both(matcher, ["CARREFOUR then AMAZON AE", "pay amazon ae at carrefour"]) == ["Groceries", "Shopping"]
+
+def test_longest_keyword_wins_at_the_same_place():
+    matcher = KeywordMatcher(RULES)
+    assert both(matcher, ["AMAZON AE PRIME 123", "AMAZON AE 123", "EMIRATES INSURANCE DXB", "EMIRATES EK 201"]) \
+        == ["Subscriptions", "Shopping", "Insurance", "Travel"]
+
+def test_newest_rule_wins_for_the_same_keyword():
+    assert both(KeywordMatcher(RULES), ["Cafe Nero"]) == ["Groceries"]
+    assert both(KeywordMatcher(RULES + [("Dining", " CAFE ")]), ["Cafe Nero"]) == ["Dining"]
+
+def test_uncategorized_and_blank_rules_are_ignored():
+    matcher = KeywordMatcher([("Shopping", "noon"), (UNCATEGORIZED, "noon"), ("Travel", "  "), (None, "x")])
+    assert both(matcher, ["NOON.COM"]) == ["Shopping"]
+
+@pytest.mark.parametrize("missing", [None, np.nan, pd.NA])
+def test_missing_details_match_nothing(missing):
+    matcher = KeywordMatcher([("Other", "non"), ("Other", "nan"), ("Other", "na")])
+    assert matcher.match(missing) is None
+    assert both(matcher, [missing, "banana"]) == [UNCATEGORIZED, "Other"]
+
+def test_no_rules():
+    assert both(KeywordMatcher([]), ["anything", None]) == [UNCATEGORIZED, UNCATEGORIZED]
@@ -0,0 +1,212 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import database
+
+def make_transactions(rows):
+    return pd.DataFrame({
+        "date": pd.to_datetime(["2025-01-%02d" % (n % 28 + 1) for n in range(rows)]),
+        "details": [f"MERCHANT {n}" for n in range(rows)],
+        "amount": [n + 0.25 for n in range(rows)],
+        "debit_or_credit": "Debit",
+        "category": "Uncategorized",
+    })
+
+#statements sent on the shared connection while fn runs
+def traced(fn):
+    statements = []
+    with database.get_connection() as conn:
+        conn.set_trace_callback(statements.append)
+    try:
+        fn()
+    finally:
+        with database.get_connection() as conn:
+            conn.set_trace_callback(None)
+    return statements
+
+def snapshot():
+    with database.get_connection() as conn:
+        return (
+            conn.execute("SELECT count(*) FROM transactions").fetchone()[0],
+            conn.execute("PRAGMA schema_version").fetchone()[0],
+            database._data_version(conn),
+        )
+
+def test_init_db_removes_duplicates_from_old_databases(db_file):
+    with sqlite3.connect(db_file) as conn:
+        conn.execute('''
+            CREATE TABLE transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT,
+                details TEXT,
+                amount REAL,
+                debit_or_credit TEXT,
+                category TEXT DEFAULT 'Uncategorized'
+            )
+        ''')
+        row = ("2025-01-05 00:00:00", "GROCER", 12.5, "Debit", "Groceries")
+        conn.executemany(
+            "INSERT INTO transactions (date, details, amount, debit_or_credit, category) VALUES (?, ?, ?, ?, ?)",
+            [row, row, ("2025-01-06 00:00:00", "GROCER", 12.5, "Debit", "Groceries")],
+        )
+    conn.close()
+
+    database.init_db()
+    df = database.load_transactions()
+    assert df["id"].tolist() == [1, 3]
+    assert df["amount"].tolist() == [12.5, 12.5]
+
+def test_init_db_again_deletes_and_rewrites_nothing(db_file):
+    database.init_db()
+    database.insert_transactions(make_transactions(50))
+    before = snapshot()
+
+    #as if the app had restarted
+    database._initialized.clear()
+    statements = traced(database.init_db)
+
+    assert snapshot() == before
+    writes = ("DELETE", "DROP", "ALTER", "INSERT INTO", "PRAGMA USER_VERSION =")
+    assert not [sql for sql in statements if sql.lstrip().upper().startswith(writes)]
+
+def test_init_db_is_a_no_op_after_the_first_call(db_file):
+    database.init_db()
+    assert traced(database.init_db) == []
+
+def test_cached_values_are_copies(db_file):
+    database.init_db()
+    database.insert_transactions(make_transactions(5))
+    df = database.load_transactions()
+    hits = database.cache_stats()["hits"]
+    df["category"] = "Shopping"
+    df.loc[0, "amount"] = 0
+    again = database.load_transactions()
+    assert (again["category"] == "Uncategorized").all()
+    assert again.loc[0, "amount"] == 0.25
+    assert database.cache_stats()["hits"] == hits + 1
+
+    database.add_keyword("Groceries", "tesco")
+    keywords = database.get_keywords()
+    keywords["Groceries"].append("lulu")
+    keywords["Transport"] = ["uber"]
+    rules = database.get_keyword_rules()
+    rules.append(("Transport", "uber"))
+    assert database.get_keywords() == {"Groceries": ["tesco"]}
+    assert database.get_keyword_rules() == [("Groceries", "tesco")]
+
+def categories():
+    with database.get_connection() as conn:
+        return conn.execute("SELECT id, category FROM transactions ORDER BY id").fetchall()
+
+def test_adding_keywords_matches_a_full_reapply(db_file):
+    database.init_db()
+    df = make_transactions(6)
+    df["details"] = ["TESCO STORES", "PETROL TESCO", "UBER TRIP", "JUST EATS UBER", "AB CAFE", "RENT"]
+    database.insert_transactions(df)
+
+    database.add_keyword("Groceries", "tesco")
+    database.add_keyword("Transport", "uber")
+    database.add_keywords([("Fuel", "petrol"), ("Eating Out", "eats"), ("Eating Out", "ab")])
+    #a newer rule for the same keyword replaces the older one
+    database.add_keyword("Taxi", "uber")
+    incremental = categories()
+
+    database.reapply_keywords()
+    assert categories() == incremental
+    assert [category for _, category in incremental] == [
+        "Groceries", "Fuel", "Taxi", "Eating Out", "Eating Out", "Uncategorized",
+    ]
+
+def rollup():
+    with database.get_connection() as conn:
+        return conn.execute("SELECT * FROM monthly_rollup ORDER BY 1, 2, 3").fetchall()
+
+def rebuilt_rollup():
+    with database.unit_of_work() as conn:
+        database.rebuild_rollup(conn)
+    return rollup()
+
+def test_rollup_matches_a_recount(db_file, monkeypatch):
+    database.init_db()
+    #several batches, some landing in months an earlier batch already added to
+    monkeypatch.setattr(database, "INSERT_BATCH_SIZE", 7)
+    df = make_transactions(30)
+    df.loc[::4, "debit_or_credit"] = "Credit"
+    df.loc[25:, "date"] = pd.Timestamp("2025-02-03")
+    database.insert_transactions(df)
+    #the same rows again are all skipped and must not be counted twice
+    database.insert_transactions(pd.concat([df.head(10), make_transactions(35).tail(5)]))
+    assert rollup() == rebuilt_rollup()
+
+    database.update_categories([("Groceries", 1), ("Groceries", 2), ("Transport", 26)])
+    assert rollup() == rebuilt_rollup()
+
+    with database.unit_of_work() as conn:
+        conn.execute("UPDATE transactions SET date = '2025-03-01', amount_cents = 99 WHERE id = 3")
+        conn.execute("DELETE FROM transactions WHERE id IN (1, 4, 27)")
+    assert rollup() == rebuilt_rollup()
+
+def test_inserts_take_their_months_off_the_archive_manifest(db_file):
+    database.init_db()
+    with database.unit_of_work() as conn:
+        conn.executemany(
+            "INSERT INTO archive_manifest (month, rows) VALUES (?, ?)",
+            [("2024-12", 1), ("2025-01", 1), ("2025-02", 1)],
+        )
+    df = make_transactions(3)
+    df.loc[2, "date"] = pd.Timestamp("2025-02-10")
+    database.insert_transactions(df)
+    with database.get_connection() as conn:
+        assert conn.execute("SELECT month FROM archive_manifest").fetchall() == [("2024-12",)]
+
+    #a file with nothing new changes no month
+    with database.unit_of_work() as conn:
+        conn.execute("INSERT INTO archive_manifest (month, rows) VALUES ('2025-01', 2)")
+    database.insert_transactions(df)
+    with database.get_connection() as conn:
+        assert conn.execute("SELECT month FROM archive_manifest ORDER BY month").fetchall() == [("2024-12",), ("2025-01",)]
+
+def test_a_failing_nested_unit_rolls_back_the_outer_one(db_file):
+    database.init_db()
+    database.insert_transactions(make_transactions(3))
+    #row count, schema and data version
+    before = snapshot()
+
+    with pytest.raises(ValueError):
+        with database.unit_of_work():
+            #add_keyword's own unit joins the outer one
+            database.add_keyword("Groceries", "merchant")
+            with database.unit_of_work() as conn:
+                conn.execute("DELETE FROM transactions WHERE id = 3")
+                raise ValueError()
+
+    assert snapshot() == before
+    assert (database.load_transactions()["category"] == "Uncategorized").all()
+    assert database.get_keyword_rules() == []
+    #the unit count was reset, later writes commit on their own again
+    database.add_keyword("Groceries", "merchant")
+    assert (database.load_transactions()["category"] == "Groceries").all()
+
+def test_apply_category_edits_saves_only_changed_rows(db_file):
+    database.init_db()
+    df = make_transactions(4)
+    df["details"] = ["GROCER", "GROCER", "GROCER", "RENT"]
+    database.insert_transactions(df)
+    original = database.load_transactions()
+
+    #an empty category is the same as Uncategorized, so nothing changed
+    edited = original.copy()
+    edited.loc[3, "category"] = None
+    before = snapshot()
+    assert database.apply_category_edits(edited, original) == 0
+    assert snapshot() == before
+
+    edited.loc[0, "category"] = "Groceries"
+    edited.loc[1, "category"] = "Shopping"
+    assert database.apply_category_edits(edited, original) == 2
+    #the newest rule for GROCER recategorizes the row that wasn't edited,
+    #the edited rows keep what was picked for them
+    assert database.load_transactions()["category"].tolist() == ["Groceries", "Shopping", "Shopping", "Uncategorized"]
+    assert database.get_keyword_rules() == [("Shopping", "grocer")]
@@ -0,0 +1,55 @@
+import faulthandler
+
+import pytest
+
+import database
+from ingest import ingest_statements
+
+class Stop(Exception):
+    pass
+
+def write_statement(path, rows, start=0):
+    with open(path, "w") as file:
+        file.write("Date,Details,Amount,Debit/Credit\n")
+        for n in range(start, start + rows):
+            file.write(f'{n % 28 + 1:02d} Jan 2025,MERCHANT {n},"1,{n % 1000:03d}.50",Debit\n')
+
+#fails the test run instead of hanging it if ingest_statements never returns
+@pytest.fixture
+def deadline():
+    faulthandler.dump_traceback_later(60, exit=True)
+    yield
+    faulthandler.cancel_dump_traceback_later()
+
+def test_ingest_saves_every_chunk(db_file, tmp_path, deadline):
+    database.init_db()
+    path = tmp_path / "statement.csv"
+    write_statement(path, 1000)
+    progress = []
+
+    results = ingest_statements([str(path)], [("Shopping", "merchant 1")],
+                                lambda done, total: progress.append(done), chunk_rows=100)
+
+    assert results == [{"inserted": 1000, "skipped": 0, "error": None}]
+    assert len(progress) == 10 and progress[-1] == path.stat().st_size
+    df = database.load_transactions()
+    assert len(df) == 1000
+    assert df["amount"].iloc[0] == 1000.5
+
+def test_ingest_returns_when_on_progress_raises(db_file, tmp_path, deadline):
+    database.init_db()
+    paths = [tmp_path / f"statement{number}.csv" for number in range(2)]
+    for number, path in enumerate(paths):
+        write_statement(path, 3000, number * 3000)
+    calls = []
+
+    #streamlit stops a script by raising in it, e.g. from st.progress
+    def on_progress(done, total):
+        calls.append(done)
+        if len(calls) == 2:
+            raise Stop()
+
+    #the workers are still reading and the queue is full when this raises
+    with pytest.raises(Stop):
+        ingest_statements([str(path) for path in paths], [], on_progress, chunk_rows=100)
+    assert len(database.load_transactions()) == 200